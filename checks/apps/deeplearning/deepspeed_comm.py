@@ -1,26 +1,73 @@
+import json
 import os
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.exceptions import SanityError
 
 
 # Codes used for the check are taken from: https://github.com/microsoft/DeepSpeedExamples/tree/master/benchmarks/communication commit 8e4cdd8
 
+# Results written by the benchmarks with --json-output, one JSON record per message size
+def read_comm_results(filename):
+    with open(filename) as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+@sn.deferrable
+def extract_comm_counts(filename):
+    return [record['count'] for record in read_comm_results(filename)]
+
+
+@sn.deferrable
+def extract_comm_result(filename, size, key, **match):
+    for record in read_comm_results(filename):
+        if record['size'] == size and all(record.get(k) == v for k, v in match.items()):
+            return record[key]
+    raise SanityError(f'no {key} for message size {size} in {filename}')
+
+
+@sn.deferrable
+def extract_model_fit(filename, key, **match):
+    for record in read_comm_results(filename):
+        if all(record.get(k) == v for k, v in match.items()):
+            return record[key]
+    raise SanityError(f'no model fit with {key} in {filename}')
+
+
 class deepspeed_comm(rfm.RunOnlyRegressionTest):
     valid_systems = ['lumi:gpu']
     valid_prog_environs = ['builtin']
     sourcesdir = 'src'
     exclusive_access = True
 
+    results_file = variable(str, value='comm_results.jsonl')
+    # Alpha-beta model fitted to results_file after the run
+    model_file = variable(str, value='comm_model.jsonl')
+    # Message size (512 MB) of the headline throughput and latencies
+    perf_size = variable(int, value=536870912)
+
     perf_relative = variable(float, value=0.0, loggable=True)
 
+    def results_path(self):
+        return os.path.join(self.stagedir, self.results_file)
+
+    def model_path(self):
+        return os.path.join(self.stagedir, self.model_file)
+
+    @run_before('run')
+    def fit_model(self):
+        # Plain Python, runs on the host after the containerised benchmark
+        self.postrun_cmds = [
+            f'python3 communication/model_fit.py {self.results_file} --output {self.model_file}'
+        ]
+
     @sanity_function
     def assert_job_is_complete(self):
-        m = 16
-        for i in range(23):
-            m = m*2
-            if not sn.assert_found(rf'{m}x4', self.stdout):
-                return False
-        return sn.assert_found(r'Performance of', self.stdout)
+        counts = extract_comm_counts(self.results_path())
+        return sn.all([
+            sn.assert_found(r'Performance of', self.stdout),
+            sn.all(sn.map(lambda m: sn.assert_in(16 * m, counts), [2**p for p in range(1, 24)])),
+        ])
 
     #@performance_function('ms')
     #def duration(self):
@@ -31,10 +78,42 @@ class deepspeed_comm(rfm.RunOnlyRegressionTest):
 
     @performance_function('Gbps')
     def throughput(self):
-        return sn.extractsingle(
-            r'512\.0 MB\s+\S+\s+\S+\s+\S+\s+(?P<throughput>\S+)\s+\S+',
-            self.stdout, 'throughput', float
-        )
+        return extract_comm_result(self.results_path(), self.perf_size, 'algbw')
+
+    # Per-trial latencies, recorded with --trial-stats
+    @performance_function('us')
+    def latency_p50(self):
+        return extract_comm_result(self.results_path(), self.perf_size, 'p50_us')
+
+    @performance_function('us')
+    def latency_p99(self):
+        return extract_comm_result(self.results_path(), self.perf_size, 'p99_us')
+
+    # Startup latency, asymptotic bus bandwidth and half-bandwidth message size
+    @performance_function('us')
+    def model_alpha(self):
+        return extract_model_fit(self.model_path(), 'alpha_us')
+
+    @performance_function('Gbps')
+    def model_busbw(self):
+        return extract_model_fit(self.model_path(), 'busbw')
+
+    @performance_function('B')
+    def model_n_half(self):
+        return extract_model_fit(self.model_path(), 'n_half')
+
+    @run_before('performance')
+    def set_size_perf_variables(self):
+        # One bus bandwidth per message size, to log the full curve
+        records = read_comm_results(self.results_path())
+        multi_dtype = len({record['dtype'] for record in records}) > 1
+        for record in records:
+            name = f"busbw_{record['size']}"
+            if multi_dtype:
+                name = f"busbw_{record['dtype']}_{record['size']}"
+            self.perf_variables[name] = sn.make_performance_function(
+                sn.make_deferrable(record['busbw']), record['bw_unit']
+            )
 
     @run_after('performance')
     def higher_the_better(self):
@@ -56,6 +135,10 @@ class ds_comm_all_reduce(deepspeed_comm):
     num_tasks_per_node = 8
     num_gpus_per_node = 8
 
+    # Swept in one launch; throughput (and its reference) stays the float one
+    dtypes = variable(list, value=['float', 'bfloat16', 'half', 'int8'])
+    dtype_bytes = {'float': 4, 'bfloat16': 2, 'half': 2, 'int8': 1}
+
     tags = {'python', 'contrib', 'performance'}
 
     reference = {
@@ -72,5 +155,15 @@ class ds_comm_all_reduce(deepspeed_comm):
     def set_container_variables(self):
         self.container_platform = 'Singularity'
         self.container_platform.image = '$SIFPYTORCH'
-        self.container_platform.command = f'bash conda-python-distributed.sh -u communication/all_reduce.py --scan --dist="{self.dist_mode}"'
+        dtypes = ','.join(self.dtypes)
+        self.container_platform.command = f'bash conda-python-distributed.sh -u communication/all_reduce.py --scan --trial-stats --dist="{self.dist_mode}" --dtypes {dtypes} --json-output {self.results_file}'
         self.container_platform.env_vars = {'NCCL_DEBUG': 'INFO'}
+
+    @run_before('performance')
+    def set_dtype_perf_variables(self):
+        # Same element count for every dtype: the one that makes 512 MB in float
+        for dtype in self.dtypes:
+            size = self.perf_size // self.dtype_bytes['float'] * self.dtype_bytes[dtype]
+            self.perf_variables[f'throughput_{dtype}'] = sn.make_performance_function(
+                extract_comm_result(self.results_path(), size, 'algbw', dtype=dtype), 'Gbps'
+            )
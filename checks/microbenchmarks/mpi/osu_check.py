@@ -6,6 +6,11 @@ from hpctestlib.microbenchmarks.mpi.osu import (build_osu_benchmarks,
                                                 fetch_osu_benchmarks,
                                                 osu_build_run)
 
+# Every message size line OSU prints: the size and the first metric column
+def osu_curve(stdout):
+    return sn.extractall(r'^(\d+)\s+(\d+(?:\.\d+)?)', stdout, [1, 2], [int, float])
+
+
 class lumi_fetch_osu_benchmarks(rfm.RunOnlyRegressionTest):
    # This test implies version 6.0 or later due to code structure change
    # introduced in the version 6.0 of OSU microbenchmarks
@@ -44,6 +49,10 @@ class lumi_osu_benchmarks(osu_build_run):
     maintainers = ['@mszpindler']
 
     perf_relative = variable(float, value=0.0, loggable=True)
+    # Largest size of the curve, the headline values stay at message_size
+    max_message_size = variable(int, value=4194304)
+    # Sizes up to which latencies are averaged into small_msg_latency
+    small_message_size = variable(int, value=64)
 
     @run_after('init')
     def setup_per_build_type(self):
@@ -67,6 +76,42 @@ class lumi_osu_benchmarks(osu_build_run):
                                        'c', 
                                        bench_path)
 
+    @run_before('run')
+    def set_max_message_size(self):
+        # OSU runs all sizes up to -m, which the library check sets to the single size it scrapes
+        if '-m' in self.executable_opts:
+            index = self.executable_opts.index('-m') + 1
+            self.executable_opts[index] = str(max(self.message_size, self.max_message_size))
+
+    @run_before('performance')
+    def set_curve_perf_variables(self):
+        # One variable per message size, then summaries of the curve
+        metric = self.benchmark_info[1]
+        unit = 'us' if metric == 'latency' else 'MB/s'
+        curve = osu_curve(self.stdout).evaluate()
+        for size, value in curve:
+            self.perf_variables[f'{metric}_{size}'] = sn.make_performance_function(sn.make_deferrable(value), unit)
+
+        if metric == 'latency':
+            small = [value for size, value in curve if size <= self.small_message_size]
+            if small:
+                self.perf_variables['small_msg_latency'] = sn.make_performance_function(
+                    sn.make_deferrable(sum(small) / len(small)), 'us'
+                )
+            # Bytes per us are MB/s
+            bandwidth = [(size, size / value) for size, value in curve if size > 0 and value > 0]
+        else:
+            bandwidth = curve
+        if not bandwidth:
+            return
+
+        peak = max(value for size, value in bandwidth)
+        half_peak_size = min(size for size, value in bandwidth if value >= peak / 2)
+        self.perf_variables['peak_bandwidth'] = sn.make_performance_function(sn.make_deferrable(peak), 'MB/s')
+        self.perf_variables['half_peak_size'] = sn.make_performance_function(
+            sn.make_deferrable(half_peak_size), 'B'
+        )
+
     @run_after('performance')
     def set_relative_perf(self):
         var_name = self.benchmark_info[1]
@@ -186,6 +231,8 @@ class lumi_osu_collective_check(lumi_osu_benchmarks):
     ], fmt=lambda x: x[0], loggable=True)
     num_nodes = parameter([1, 2, 4])
     osu_binaries = fixture(lumi_build_osu_benchmarks, scope='environment')
+    # Up to 1 MB, larger all_reduces over all cores of 4 nodes do not fit the time limit
+    max_message_size = 1048576
     allref = {
         'mpi.collective.blocking.osu_allreduce': {
             1: {
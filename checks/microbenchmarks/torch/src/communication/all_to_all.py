@@ -14,7 +14,7 @@ from communication.constants import *
 from deepspeed.accelerator import get_accelerator
 
 
-def timed_all_to_all(input, output, start_event, end_event, args):
+def timed_all_to_all(input, output, start_event, end_event, args, group=None):
     if args.dist == 'torch':
         import torch.distributed as dist
     elif args.dist == 'deepspeed':
@@ -23,32 +23,30 @@ def timed_all_to_all(input, output, start_event, end_event, args):
     sync_all()
     # Warmups, establish connections, etc.
     for i in range(args.warmups):
-        dist.all_to_all_single(output, input, async_op=args.async_op)
+        dist.all_to_all_single(output, input, group=group, async_op=args.async_op)
     sync_all()
 
+    def comm_fn():
+        return dist.all_to_all_single(output, input, group=group, async_op=args.async_op)
+
     # time the actual comm op trials times and average it
-    start_event.record()
-    for i in range(args.trials):
-        dist.all_to_all_single(output, input, async_op=args.async_op)
-    end_event.record()
-    sync_all()
-    duration = start_event.elapsed_time(end_event) / 1000
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
 
     # maintain and clean performance data
-    avg_duration = duration / args.trials
     size = input.element_size() * input.nelement()
-    n = dist.get_world_size()
-    tput, busbw = get_bw('all_to_all', size, avg_duration, args)
+    tput, busbw = get_bw('all_to_all', size, avg_duration, args, group=group)
     tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
     desc = f'{input.nelement()}x{input.element_size()}'
 
+    write_result(args, 'all_to_all', input, avg_duration, stats, tput, busbw, group=group)
+
     if not args.raw:
         size = convert_size(size)
 
-    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}")
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" + get_stats_string(args, stats, avg_duration))
 
 
-def run_all_to_all(local_rank, args):
+def run_all_to_all(local_rank, args, group=None, group_class=None):
     if args.dist == 'torch':
         import torch.distributed as dist
     elif args.dist == 'deepspeed':
@@ -57,27 +55,40 @@ def run_all_to_all(local_rank, args):
     world_size = dist.get_world_size()
     global_rank = dist.get_rank()
     # Prepare benchmark header
-    print_header(args, 'all_to_all')
+    print_header(args, 'all_to_all', group=group, group_class=group_class)
 
-    start_event = torch.cuda.Event(enable_timing=True)
-    end_event = torch.cuda.Event(enable_timing=True)
+    start_event = new_event()
+    end_event = new_event()
 
     if args.scan:
-        M_LIST = []
-        for x in (2**p for p in range(1, args.maxsize)):
-            M_LIST.append(x)
-
+        # Sizes whose buffers fit into the free memory
+        M_LIST = scan_sizes('all_to_all', getattr(torch, args.dtype), local_rank, args, group=group)
+
+        if args.preallocate and M_LIST:
+            arena_input, arena_output = alloc_scan_buffers('all_to_all',
+                                                           getattr(torch, args.dtype),
+                                                           local_rank,
+                                                           args,
+                                                           max_m=M_LIST[-1])
+
+        setup_time = 0
+        comm_time = 0
         sync_all()
         # loop over various tensor sizes
         for M in M_LIST:
+            setup_start = time.perf_counter()
             global_rank = dist.get_rank()
             try:
-                mat = torch.ones(world_size, M,
-                                 dtype=getattr(torch, args.dtype)).to(get_accelerator().device_name(local_rank))
-                assert mat.numel() % world_size == 0, f"tensor cannot be divided in {world_size} chunks"
-                sync_all()
-                input = ((mat.mul_(float(global_rank))).view(-1))
-                output = (mat.clone().view(-1))
+                if args.preallocate:
+                    input = scan_view(arena_input, world_size * M).fill_(float(global_rank))
+                    output = scan_view(arena_output, world_size * M)
+                else:
+                    mat = torch.ones(world_size, M,
+                                     dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
+                    assert mat.numel() % world_size == 0, f"tensor cannot be divided in {world_size} chunks"
+                    sync_all()
+                    input = ((mat.mul_(global_rank)).view(-1))
+                    output = (mat.clone().view(-1))
             except RuntimeError as e:
                 if 'out of memory' in str(e):
                     if dist.get_rank() == 0:
@@ -87,7 +98,11 @@ def run_all_to_all(local_rank, args):
                 else:
                     raise e
             sync_all()
-            timed_all_to_all(input, output, start_event, end_event, args)
+            comm_start = time.perf_counter()
+            setup_time += comm_start - setup_start
+            timed_all_to_all(input, output, start_event, end_event, args, group=group)
+            comm_time += time.perf_counter() - comm_start
+        print_scan_times(setup_time, comm_time)
     else:
         # Send the biggest message size our GPUs can fit. If you're facing OOM errors, reduce the mem_factor
         elements_per_gpu = max_numel(comm_op='all_to_all',
@@ -97,15 +112,15 @@ def run_all_to_all(local_rank, args):
                                      args=args)
         try:
             mat = torch.ones(elements_per_gpu, dtype=getattr(torch,
-                                                             args.dtype)).to(get_accelerator().device_name(local_rank))
+                                                             args.dtype)).to(get_device(local_rank))
             assert mat.numel(
             ) % world_size == 0, f"tensor with {mat.numel()} elements cannot be divided in {world_size} chunks"
-            input = ((mat.mul_(float(global_rank))).view(-1))
+            input = ((mat.mul_(global_rank)).view(-1))
             # Delete original mat to avoid OOM
             del mat
-            get_accelerator().empty_cache()
+            empty_cache()
             output = torch.zeros(elements_per_gpu,
-                                 dtype=getattr(torch, args.dtype)).to(get_accelerator().device_name(local_rank))
+                                 dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
         except RuntimeError as e:
             if 'out of memory' in str(e):
                 if dist.get_rank() == 0:
@@ -122,7 +137,7 @@ def run_all_to_all(local_rank, args):
                     print(f"Before AllToAll Input List at rank {global_rank}: {input}")
                 dist.barrier()
 
-        timed_all_to_all(input, output, start_event, end_event, args)
+        timed_all_to_all(input, output, start_event, end_event, args, group=group)
 
         if args.debug:
             for i in range(world_size):
@@ -135,4 +150,4 @@ if __name__ == "__main__":
     args = benchmark_parser().parse_args()
     rank = args.local_rank
     init_processes(local_rank=rank, args=args)
-    run_all_to_all(local_rank=rank, args=args)
+    run_comm_op(run_all_to_all, local_rank=rank, args=args)
@@ -0,0 +1,162 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import numpy as np
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def split_matrix(n, numel, args):
+    """
+    Returns S with S[src][dst] the elements src sends to dst, routing numel elements per
+    rank with the --skew distribution. Every rank computes the whole matrix from --seed,
+    so the output splits are known without an extra exchange.
+    """
+    hot_rank = int(np.random.default_rng(args.seed).integers(n))
+    splits = []
+    for src in range(n):
+        rng = np.random.default_rng([args.seed, src])
+        if args.skew == 'uniform' or n == 1:
+            p = np.full(n, 1 / n)
+        elif args.skew == 'zipf':
+            # Every source has its own popular experts
+            p = 1 / (rng.permutation(n) + 1.0)**args.zipf_alpha
+            p /= p.sum()
+        elif args.skew == 'hot':
+            # One expert, the same for all sources, gets --hot-fraction of the tokens
+            p = np.full(n, (1 - args.hot_fraction) / (n - 1))
+            p[hot_rank] = args.hot_fraction
+        splits.append(rng.multinomial(numel, p).tolist())
+    return splits
+
+
+# Run all_to_all_single with uneven splits and print metrics
+def timed_all_to_all_uneven(input, output, splits, start_event, end_event, args, group=None):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    n = len(splits)
+    rank = dist.get_rank(group=group)
+    input_splits = splits[rank]
+    output_splits = [splits[src][rank] for src in range(n)]
+
+    def comm_fn():
+        return dist.all_to_all_single(output,
+                                      input,
+                                      output_split_sizes=output_splits,
+                                      input_split_sizes=input_splits,
+                                      group=group,
+                                      async_op=args.async_op)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        comm_fn()
+    sync_all()
+
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
+
+    # Bandwidths from the bytes that actually leave their rank, averaged over the ranks
+    element_size = input.element_size()
+    size = element_size * input.nelement()
+    moved = element_size * sum(splits[src][dst] for src in range(n) for dst in range(n) if src != dst) / n
+    received = [element_size * sum(splits[src][dst] for src in range(n)) for dst in range(n)]
+    max_received = max(received)
+    imbalance = max_received / (sum(received) / n)
+    # pt2pt is plain bytes / duration, moved already holds the bus traffic
+    tput = get_bw('pt2pt', size, avg_duration, args)[0]
+    busbw = get_bw('pt2pt', moved, avg_duration, args)[0]
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    desc = f'{input.nelement()}x{element_size}'
+
+    write_result(args,
+                 'all_to_all_uneven',
+                 input,
+                 avg_duration,
+                 stats,
+                 tput,
+                 busbw,
+                 group=group,
+                 skew=args.skew,
+                 seed=args.seed,
+                 moved_bytes=moved,
+                 max_recv_bytes=max_received,
+                 imbalance=imbalance)
+
+    if not args.raw:
+        size = convert_size(size)
+        max_received = convert_size(max_received)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, avg_duration) + f" {max_received:<20} {imbalance:<20.3f}")
+
+
+def run_all_to_all_uneven(local_rank, args, group=None, group_class=None):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    # Prepare benchmark header
+    print_header(args,
+                 f'all_to_all_uneven ({args.skew})',
+                 group=group,
+                 group_class=group_class,
+                 extra_columns=['Max recv (Bytes)', 'Imbalance'])
+    world_size = dist.get_world_size()
+    group_size = dist.get_world_size(group=group)
+    rank = dist.get_rank(group=group)
+    device = get_device(local_rank)
+    dtype = getattr(torch, args.dtype)
+
+    start_event = new_event()
+    end_event = new_event()
+
+    if args.scan:
+        # Sizes whose buffers fit into the free memory, with room for a skewed receive side
+        M_LIST = scan_sizes('all_to_all', dtype, local_rank, args, group=group, buffers=2)
+    else:
+        # The largest equal-split size that fits, the receive side of a skewed split can be several times that
+        elements_per_gpu = max_numel(comm_op='all_to_all',
+                                     dtype=dtype,
+                                     mem_factor=args.mem_factor / 2,
+                                     local_rank=local_rank,
+                                     args=args)
+        M_LIST = [elements_per_gpu // world_size]
+
+    sync_all()
+    # loop over various tensor sizes
+    for M in M_LIST:
+        splits = split_matrix(group_size, world_size * M, args)
+        try:
+            input = torch.empty(world_size * M, dtype=dtype, device=device).fill_(float(dist.get_rank()))
+            output = torch.empty(sum(splits[src][rank] for src in range(group_size)), dtype=dtype, device=device)
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                sync_all()
+                break
+            else:
+                raise e
+        sync_all()
+        timed_all_to_all_uneven(input, output, splits, start_event, end_event, args, group=group)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_all_to_all_uneven, local_rank=rank, args=args)
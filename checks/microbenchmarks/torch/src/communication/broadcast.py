@@ -14,69 +14,84 @@ from communication.constants import *
 from deepspeed.accelerator import get_accelerator
 
 
-def timed_broadcast(input, start_event, end_event, args):
+def timed_broadcast(input, start_event, end_event, args, group=None, src=None):
     if args.dist == 'torch':
         import torch.distributed as dist
     elif args.dist == 'deepspeed':
         import deepspeed.comm as dist
 
+    if src is None:
+        src = get_group_root(group)
     sync_all()
     # Warmups, establish connections, etc.
     for i in range(args.warmups):
-        dist.broadcast(input, 0, async_op=args.async_op)
+        dist.broadcast(input, src, group=group, async_op=args.async_op)
     sync_all()
 
+    def comm_fn():
+        return dist.broadcast(input, src, group=group, async_op=args.async_op)
+
     # time the actual comm op trials times and average it
-    start_event.record()
-    for i in range(args.trials):
-        dist.broadcast(input, 0, async_op=args.async_op)
-    end_event.record()
-    sync_all()
-    duration = start_event.elapsed_time(end_event) / 1000
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
 
     # maintain and clean performance data
-    avg_duration = duration / args.trials
     size = input.element_size() * input.nelement()
-    n = dist.get_world_size()
-    tput, busbw = get_bw('broadcast', size, avg_duration, args)
+    tput, busbw = get_bw('broadcast', size, avg_duration, args, group=group)
     tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
     desc = f'{input.nelement()}x{input.element_size()}'
 
+    root_fields = get_root_fields(src, args)
+    write_result(args, 'broadcast', input, avg_duration, stats, tput, busbw, group=group, **root_fields)
+
     if not args.raw:
         size = convert_size(size)
 
-    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}")
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, avg_duration) + get_root_string(root_fields))
 
 
-def run_broadcast(local_rank, args):
+def run_broadcast(local_rank, args, group=None, group_class=None):
     if args.dist == 'torch':
         import torch.distributed as dist
     elif args.dist == 'deepspeed':
         import deepspeed.comm as dist
 
     # Prepare benchmark header
-    print_header(args, 'broadcast')
+    print_header(args, 'broadcast', group=group, group_class=group_class, extra_columns=get_root_header(args))
 
     world_size = dist.get_world_size()
     global_rank = dist.get_rank()
 
-    start_event = torch.cuda.Event(enable_timing=True)
-    end_event = torch.cuda.Event(enable_timing=True)
+    start_event = new_event()
+    end_event = new_event()
 
     if args.scan:
-        M_LIST = []
-        for x in (2**p for p in range(1, args.maxsize)):
-            M_LIST.append(x)
-
+        # Sizes whose buffers fit into the free memory
+        M_LIST = scan_sizes('broadcast', getattr(torch, args.dtype), local_rank, args, group=group)
+
+        if args.preallocate and M_LIST:
+            arena_input, _ = alloc_scan_buffers('broadcast',
+                                                getattr(torch, args.dtype),
+                                                local_rank,
+                                                args,
+                                                group=group,
+                                                max_m=M_LIST[-1])
+
+        setup_time = 0
+        comm_time = 0
         sync_all()
         # loop over various tensor sizes
         for M in M_LIST:
+            setup_start = time.perf_counter()
             global_rank = dist.get_rank()
             try:
-                mat = torch.ones(world_size, M,
-                                 dtype=getattr(torch, args.dtype)).to(get_accelerator().device_name(local_rank))
-                sync_all()
-                input = ((mat.mul_(float(global_rank))).view(-1))
+                if args.preallocate:
+                    input = scan_view(arena_input, world_size * M).fill_(float(global_rank))
+                else:
+                    mat = torch.ones(world_size, M,
+                                     dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
+                    sync_all()
+                    input = ((mat.mul_(global_rank)).view(-1))
             except RuntimeError as e:
                 if 'out of memory' in str(e):
                     if dist.get_rank() == 0:
@@ -86,7 +101,12 @@ def run_broadcast(local_rank, args):
                 else:
                     raise e
             sync_all()
-            timed_broadcast(input, start_event, end_event, args)
+            comm_start = time.perf_counter()
+            setup_time += comm_start - setup_start
+            for src in get_roots(args, group=group):
+                timed_broadcast(input, start_event, end_event, args, group=group, src=src)
+            comm_time += time.perf_counter() - comm_start
+        print_scan_times(setup_time, comm_time)
     else:
         # Send the biggest message size our GPUs can fit. If you're facing OOM errors, reduce the mem_factor
         # Don't need output tensor, so we double mem_factor
@@ -97,8 +117,8 @@ def run_broadcast(local_rank, args):
                                      args=args)
         try:
             mat = torch.ones(elements_per_gpu, dtype=getattr(torch,
-                                                             args.dtype)).to(get_accelerator().device_name(local_rank))
-            input = ((mat.mul_(float(global_rank))).view(-1))
+                                                             args.dtype)).to(get_device(local_rank))
+            input = ((mat.mul_(global_rank)).view(-1))
         except RuntimeError as e:
             if 'out of memory' in str(e):
                 if dist.get_rank() == 0:
@@ -106,11 +126,12 @@ def run_broadcast(local_rank, args):
                 sync_all()
                 return
         sync_all()
-        timed_broadcast(input, start_event, end_event, args)
+        for src in get_roots(args, group=group):
+            timed_broadcast(input, start_event, end_event, args, group=group, src=src)
 
 
 if __name__ == "__main__":
     args = benchmark_parser().parse_args()
     rank = args.local_rank
     init_processes(local_rank=rank, args=args)
-    run_broadcast(local_rank=rank, args=args)
+    run_comm_op(run_broadcast, local_rank=rank, args=args)
@@ -0,0 +1,170 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def coalesced_fn(tensors, args):
+    """
+    Returns a comm_fn that all_reduces tensors as one coalesced group. Uses the coalescing
+    manager of torch.distributed, which FSDP and DDP use, and all_reduce_coalesced where
+    it is missing. Both are torch.distributed APIs, which deepspeed.comm also initialises underneath.
+    """
+    if hasattr(torch.distributed, '_coalescing_manager'):
+
+        def comm_fn():
+            with torch.distributed._coalescing_manager(async_ops=args.async_op) as manager:
+                for tensor in tensors:
+                    torch.distributed.all_reduce(tensor)
+            return manager
+    else:
+
+        def comm_fn():
+            return torch.distributed.all_reduce_coalesced(tensors, async_op=args.async_op)
+
+    return comm_fn
+
+
+def flat_all_reduce_fn(tensors):
+    """
+    Returns a comm_fn that all_reduces tensors the way DDP and Apex do with flat buffers:
+    copy them into a new flat buffer, all_reduce it and copy the result back. The copy
+    back needs the result, so the all_reduce is blocking whatever --async-op says.
+    """
+    from torch._utils import _flatten_dense_tensors, _unflatten_dense_tensors
+
+    def comm_fn():
+        flat = _flatten_dense_tensors(tensors)
+        torch.distributed.all_reduce(flat)
+        for tensor, synced in zip(tensors, _unflatten_dense_tensors(flat, tensors)):
+            tensor.copy_(synced)
+
+    return comm_fn
+
+
+# Time the tensors as separate, coalesced and one flattened all_reduce, and print metrics
+def timed_coalesced(tensors, start_event, end_event, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    def separate_fn():
+        for tensor in tensors:
+            handle = dist.all_reduce(tensor, async_op=args.async_op)
+        return handle
+
+    coalesced = coalesced_fn(tensors, args)
+    flat_fn = flat_all_reduce_fn(tensors)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        separate_fn()
+        coalesced()
+        flat_fn()
+    sync_all()
+
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(separate_fn, start_event, end_event, args)
+    coalesced_duration = time_trials(coalesced, start_event, end_event, args)[0]
+    flat_duration = time_trials(flat_fn, start_event, end_event, args)[0]
+
+    # All three move the same bytes, the standard columns are for the separate ops
+    count = sum(tensor.nelement() for tensor in tensors)
+    size = tensors[0].element_size() * count
+    tput, busbw = get_bw('all_reduce', size, avg_duration, args)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    desc = f'{len(tensors)}x{tensors[0].nelement()}x{tensors[0].element_size()}'
+    ns_per_byte = {
+        'separate': avg_duration * 1e9 / size,
+        'coalesced': coalesced_duration * 1e9 / size,
+        'flat': flat_duration * 1e9 / size,
+    }
+
+    write_result(args,
+                 'coalesced',
+                 tensors[0],
+                 avg_duration,
+                 stats,
+                 tput,
+                 busbw,
+                 size=size,
+                 count=count,
+                 num_tensors=len(tensors),
+                 tensor_size=tensors[0].element_size() * tensors[0].nelement(),
+                 coalesced_us=coalesced_duration * 1e6,
+                 flat_us=flat_duration * 1e6,
+                 **{f'{way}_ns_per_byte': value for way, value in ns_per_byte.items()})
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, avg_duration) +
+                 f" {coalesced_duration * 1e6:<20.3f} {flat_duration * 1e6:<20.3f}" +
+                 ''.join(f" {value:<20.4f}" for value in ns_per_byte.values()))
+
+
+def run_coalesced(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    # Prepare benchmark header
+    print_header(args,
+                 f'coalesced all_reduce ({args.num_tensors} tensors)',
+                 extra_columns=[
+                     'Coalesced (us)', 'Flat (us)', 'Separate (ns/B)', 'Coalesced (ns/B)', 'Flat (ns/B)'
+                 ])
+    device = get_device(local_rank)
+    dtype = getattr(torch, args.dtype)
+
+    start_event = new_event()
+    end_event = new_event()
+
+    if args.scan:
+        # Elements per tensor, as long as all of them and the flat copy fit
+        max_numel_per_tensor = max_numel(comm_op='all_reduce',
+                                         dtype=dtype,
+                                         mem_factor=args.mem_factor / 2,
+                                         local_rank=local_rank,
+                                         args=args) // args.num_tensors
+        M_LIST = [2**p for p in range(1, args.maxsize) if 2**p <= max_numel_per_tensor]
+    else:
+        M_LIST = [COALESCED_DEFAULT_NUMEL]
+
+    sync_all()
+    # loop over various tensor sizes
+    for M in M_LIST:
+        try:
+            # Separate allocations, as for parameters or gradients that are not in a flat buffer
+            tensors = [torch.ones(M, dtype=dtype, device=device) for _ in range(args.num_tensors)]
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                sync_all()
+                break
+            else:
+                raise e
+        sync_all()
+        timed_coalesced(tensors, start_event, end_event, args)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_coalesced, local_rank=rank, args=args, topology=False)
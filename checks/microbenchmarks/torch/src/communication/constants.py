@@ -12,4 +12,29 @@ DEFAULT_BACKEND = get_accelerator().communication_backend_name()
 DEFAULT_UNIT = 'Gbps'
 DEFAULT_DIST = 'deepspeed'
 DEFAULT_MAXSIZE = 24
+DEFAULT_STREAMS = 4
+DEFAULT_GEMM_SIZE = 8192
 TORCH_DISTRIBUTED_DEFAULT_PORT = 29500
+# --time-budget: pilot trials per message size, CI default and limit, and z for 95%
+PILOT_TRIALS = 5
+DEFAULT_TARGET_CI = 0.01
+DEFAULT_MAX_TRIALS = 1000
+CI_Z = 1.96
+# --pt2pt-matrix: latency and bandwidth message sizes in bytes
+DEFAULT_MATRIX_LATENCY_SIZE = 8
+DEFAULT_MATRIX_BW_SIZE = 67108864
+# --ddp-buckets: DDP's default bucket_cap_mb and its 1 MiB first bucket
+DEFAULT_BUCKET_CAP_MB = 25
+DDP_FIRST_BUCKET_BYTES = 1024 * 1024
+DEFAULT_MICRO_BATCHES = 8
+# --graph: side stream warmups before capture and the single-size element count (8 KB of float)
+GRAPH_WARMUPS = 3
+GRAPH_DEFAULT_NUMEL = 2048
+# Communication library settings recorded with every --json-output record
+TUNING_ENV_VARS = ('NCCL_ALGO', 'NCCL_PROTO', 'NCCL_MIN_NCHANNELS', 'NCCL_MAX_NCHANNELS', 'NCCL_NET_GDR_LEVEL')
+# --coalesced: tensors per group and the single-size elements per tensor (4 KB of float)
+DEFAULT_NUM_TENSORS = 64
+COALESCED_DEFAULT_NUMEL = 1024
+# Share of the free memory the buffers of the largest --scan size may take, the rest is headroom
+SCAN_MEM_FRACTION = 0.9
+LATENCY_STATS = ('min', 'p50', 'p90', 'p99', 'max', 'stddev')
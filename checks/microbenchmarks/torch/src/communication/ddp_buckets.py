@@ -0,0 +1,145 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def ddp_bucket_sizes(param_bytes, bucket_cap, first_bucket_cap):
+    """
+    Groups the gradient sizes into buckets the way DDP does: in reverse parameter order,
+    as the backward pass produces them, closing a bucket once it reaches the cap. The
+    first bucket has its own, smaller cap so that communication starts early.
+    """
+    buckets = []
+    current = 0
+    cap = first_bucket_cap
+    for nbytes in reversed(param_bytes):
+        current += nbytes
+        if current >= cap:
+            buckets.append(current)
+            current = 0
+            cap = bucket_cap
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def get_bucket_profile(args):
+    # Bucket sizes in bytes, from --bucket-profile or from the parameters of --bucket-model
+    if args.bucket_profile:
+        with open(args.bucket_profile) as fp:
+            return [int(line.split('#')[0]) for line in fp if line.split('#')[0].strip()]
+
+    try:
+        import torchvision
+    except ImportError:
+        print_rank_0("torchvision is not installed, pass a bucket size file with --bucket-profile")
+        exit(0)
+    # Only the parameter shapes matter, so skip the pretrained weights
+    model = getattr(torchvision.models, args.bucket_model)(weights=None)
+    element_size = torch.tensor([], dtype=getattr(torch, args.dtype)).element_size()
+    param_bytes = [p.numel() * element_size for p in model.parameters() if p.requires_grad]
+    return ddp_bucket_sizes(param_bytes, int(args.bucket_cap_mb * 1024 * 1024), DDP_FIRST_BUCKET_BYTES)
+
+
+# Replay one step's buckets back to back and print metrics
+def timed_ddp_buckets(buckets, flat, start_event, end_event, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    # Like DDP, every bucket is launched as soon as it is ready and the step waits for all of them
+    def step():
+        handles = [dist.all_reduce(bucket, async_op=True) for bucket in buckets]
+        for handle in handles:
+            handle.wait()
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        step()
+    sync_all()
+
+    step_duration, stats = time_trials(step, start_event, end_event, args)
+
+    # The same buckets one at a time, what the step would cost without pipelining
+    serial_duration = 0
+    for bucket in buckets:
+        serial_duration += time_trials(lambda: dist.all_reduce(bucket), start_event, end_event, args)[0]
+
+    # maintain and clean performance data
+    size = flat.element_size() * flat.nelement()
+    tput, busbw = get_bw('all_reduce', size, step_duration, args)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, step_duration)
+    desc = f'{len(buckets)} buckets'
+
+    write_result(args,
+                 'ddp_buckets',
+                 flat,
+                 step_duration,
+                 stats,
+                 tput,
+                 busbw,
+                 model=args.bucket_profile or args.bucket_model,
+                 buckets=len(buckets),
+                 bucket_sizes=[bucket.element_size() * bucket.nelement() for bucket in buckets],
+                 serial_us=serial_duration * 1e6)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, step_duration) + f" {serial_duration * 1e6:<20.3f}")
+
+
+def run_ddp_buckets(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    dtype = getattr(torch, args.dtype)
+    element_size = torch.tensor([], dtype=dtype).element_size()
+    profile = get_bucket_profile(args)
+
+    print_header(args,
+                 f'ddp_buckets ({args.bucket_profile or args.bucket_model})',
+                 extra_columns=['Serial (us)'])
+    print_rank_0("Bucket sizes (Bytes): " + ' '.join(str(nbytes) for nbytes in profile))
+
+    # All buckets are views of one flat gradient buffer, as in DDP
+    counts = [max(nbytes // element_size, 1) for nbytes in profile]
+    try:
+        flat = torch.ones(sum(counts), dtype=dtype, device=get_device(local_rank))
+    except RuntimeError as e:
+        if 'out of memory' in str(e):
+            if dist.get_rank() == 0:
+                print('WARNING: Ran out of GPU memory. The bucket profile does not fit!')
+            sync_all()
+            return
+        else:
+            raise e
+    buckets = list(flat.split(counts))
+
+    start_event = new_event()
+    end_event = new_event()
+    sync_all()
+    timed_ddp_buckets(buckets, flat, start_event, end_event, args)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_ddp_buckets, local_rank=rank, args=args, topology=False)
@@ -0,0 +1,145 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def capture_graph(comm_fn, ops):
+    """
+    Captures ops calls of comm_fn in a HIP/CUDA graph. Returns None when the backend
+    cannot be captured on any rank, e.g. a communication library without graph support.
+    """
+    # Capture needs a warmed-up side stream
+    stream = torch.cuda.Stream()
+    stream.wait_stream(torch.cuda.current_stream())
+    with torch.cuda.stream(stream):
+        for i in range(GRAPH_WARMUPS):
+            comm_fn()
+    torch.cuda.current_stream().wait_stream(stream)
+
+    graph = torch.cuda.CUDAGraph()
+    captured = torch.ones(1, dtype=torch.int32, device=torch.cuda.current_device())
+    try:
+        with torch.cuda.graph(graph):
+            for i in range(ops):
+                comm_fn()
+    except RuntimeError as e:
+        print(f"WARNING: graph capture failed on rank {torch.distributed.get_rank()}: {e}")
+        captured.zero_()
+    # Replay only if all ranks captured, the others would wait for collectives that are never launched
+    torch.distributed.all_reduce(captured, op=torch.distributed.ReduceOp.MIN)
+    if captured.item() == 0:
+        return None
+    return graph
+
+
+# Time --graph-op eagerly and replayed from a graph, and print metrics
+def timed_graph_latency(input, output, start_event, end_event, args):
+    op_fn = get_comm_fn(args.graph_op, args)
+
+    def comm_fn():
+        return op_fn(output, input, None)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        comm_fn()
+    sync_all()
+
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
+
+    # One replay launches args.trials ops, so the host pays for one launch instead of args.trials
+    graph = capture_graph(comm_fn, args.trials)
+    graph_duration = None
+    if graph is not None:
+        sync_all()
+        graph.replay()
+        sync_all()
+        graph_duration = time_trials(graph.replay, start_event, end_event, args)[0] / args.trials
+
+    # maintain and clean performance data
+    size = input.element_size() * input.nelement()
+    tput, busbw = get_bw(args.graph_op, size, avg_duration, args)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    desc = f'{input.nelement()}x{input.element_size()}'
+
+    graph_fields = {}
+    graph_str = f" {'-':20s} {'-':20s}"
+    if graph_duration is not None:
+        graph_fields = {'graph_us': graph_duration * 1e6, 'overhead_us': (avg_duration - graph_duration) * 1e6}
+        graph_str = f" {graph_fields['graph_us']:<20.3f} {graph_fields['overhead_us']:<20.3f}"
+    write_result(args, args.graph_op, input, avg_duration, stats, tput, busbw, **graph_fields)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, avg_duration) + graph_str)
+
+
+def run_graph_latency(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    if args.device == 'cpu':
+        print_rank_0('--graph needs an accelerator, skipping it with --device cpu')
+        return
+
+    # Prepare benchmark header, the columns up to the bus bandwidth are for eager execution
+    print_header(args, f'{args.graph_op} eager and graph-replayed', extra_columns=['Graph (us)', 'Overhead (us)'])
+
+    world_size = dist.get_world_size()
+    global_rank = dist.get_rank()
+    device = get_device(local_rank)
+    dtype = getattr(torch, args.dtype)
+
+    start_event = new_event()
+    end_event = new_event()
+
+    if args.scan:
+        # Sizes whose buffers fit into the free memory
+        M_LIST = scan_sizes(args.graph_op, dtype, local_rank, args)
+    else:
+        # Host overhead only matters for small messages, a single one of a few KB
+        M_LIST = [GRAPH_DEFAULT_NUMEL // world_size]
+
+    sync_all()
+    # loop over various tensor sizes
+    for M in M_LIST:
+        try:
+            input = torch.empty(world_size * M, dtype=dtype, device=device).fill_(float(global_rank))
+            output = None
+            if output_numel(args.graph_op, world_size * M, world_size) is not None:
+                output = torch.empty(output_numel(args.graph_op, world_size * M, world_size),
+                                     dtype=dtype,
+                                     device=device)
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                sync_all()
+                break
+            else:
+                raise e
+        sync_all()
+        timed_graph_latency(input, output, start_event, end_event, args)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_graph_latency, local_rank=rank, args=args, topology=False)
@@ -0,0 +1,160 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def hierarchical_fn(input, shard, intra_group, inter_group, args):
+    """
+    Returns a comm_fn for the two-level all_reduce of input: reduce_scatter within the
+    node, all_reduce of the shard between the nodes, all_gather within the node. Each
+    step waits on the previous one, which is a stream dependency and does not block the host.
+    """
+    reduce_scatter_fn = get_comm_fn('reduce_scatter', args)
+    all_reduce_fn = get_comm_fn('all_reduce', args)
+    all_gather_fn = get_comm_fn('all_gather', args)
+
+    def comm_fn():
+        handle = reduce_scatter_fn(shard, input, intra_group)
+        if handle is not None:
+            handle.wait()
+        handle = all_reduce_fn(None, shard, inter_group)
+        if handle is not None:
+            handle.wait()
+        return all_gather_fn(input, shard, intra_group)
+
+    return comm_fn
+
+
+# Time the hierarchical and the flat all_reduce of input, and print metrics
+def timed_hier_all_reduce(input, shard, intra_group, inter_group, start_event, end_event, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    flat_fn = lambda: dist.all_reduce(input, async_op=args.async_op)
+    hier_fn = hierarchical_fn(input, shard, intra_group, inter_group, args)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        flat_fn()
+        hier_fn()
+    sync_all()
+
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(hier_fn, start_event, end_event, args)
+    flat_duration = time_trials(flat_fn, start_event, end_event, args)[0]
+
+    # Same result as the flat all_reduce, so the same bus bandwidth formula
+    size = input.element_size() * input.nelement()
+    tput, busbw = get_bw('all_reduce', size, avg_duration, args)
+    flat_busbw = get_bw('all_reduce', size, flat_duration, args)[1]
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    speedup = flat_duration / avg_duration
+    desc = f'{input.nelement()}x{input.element_size()}'
+
+    write_result(args,
+                 'hier_all_reduce',
+                 input,
+                 avg_duration,
+                 stats,
+                 tput,
+                 busbw,
+                 flat_us=flat_duration * 1e6,
+                 flat_busbw=flat_busbw,
+                 speedup=speedup)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, avg_duration) +
+                 f" {flat_duration * 1e6:<20.3f} {flat_busbw:<20.3f} {speedup:<20.3f}")
+    return speedup
+
+
+def run_hier_all_reduce(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    # The node-local and inter-node groups of --group-topology are the two levels
+    groups = dict(get_topology_groups())
+    intra_group = groups['intra-node']
+    inter_group = groups['inter-node']
+    local_world_size = dist.get_world_size(group=intra_group)
+
+    # Prepare benchmark header, the columns up to the bus bandwidth are for the hierarchical all_reduce
+    print_header(args,
+                 f'hier_all_reduce ({dist.get_world_size(group=inter_group)} nodes of {local_world_size})',
+                 extra_columns=['Flat (us)', f'Flat BusBW ({args.bw_unit})', 'Speedup'])
+
+    world_size = dist.get_world_size()
+    global_rank = dist.get_rank()
+    device = get_device(local_rank)
+    dtype = getattr(torch, args.dtype)
+
+    start_event = new_event()
+    end_event = new_event()
+
+    if args.scan:
+        # Sizes whose input and shard fit into the free memory
+        M_LIST = scan_sizes('all_reduce', dtype, local_rank, args, buffers=(local_world_size + 1) / local_world_size)
+    else:
+        # The shard is another 1/local_world_size of the input, an all_reduce needs no output
+        elements_per_gpu = max_numel(comm_op='all_reduce',
+                                     dtype=dtype,
+                                     mem_factor=args.mem_factor * 2 * local_world_size / (local_world_size + 1),
+                                     local_rank=local_rank,
+                                     args=args)
+        M_LIST = [elements_per_gpu // world_size]
+
+    speedups = []
+    sync_all()
+    # loop over various tensor sizes
+    for M in M_LIST:
+        try:
+            input = torch.empty(world_size * M, dtype=dtype, device=device).fill_(float(global_rank))
+            shard = torch.empty(world_size * M // local_world_size, dtype=dtype, device=device)
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                sync_all()
+                break
+            else:
+                raise e
+        sync_all()
+        speedup = timed_hier_all_reduce(input, shard, intra_group, inter_group, start_event, end_event, args)
+        speedups.append((input.element_size() * input.nelement(), speedup))
+
+    # Smallest size from which the hierarchical all_reduce stays faster
+    crossover = None
+    for size, speedup in reversed(speedups):
+        if speedup <= 1:
+            break
+        crossover = size
+    if crossover is None:
+        print_rank_0("Crossover: the flat all_reduce is faster at the largest size")
+    else:
+        print_rank_0(f"Crossover: the hierarchical all_reduce is faster from {convert_size(crossover)}")
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_hier_all_reduce, local_rank=rank, args=args, topology=False)
@@ -0,0 +1,67 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os, time, json
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+# Report the startup phases timed by init_torch_distributed, plus the first two collectives
+def run_init_timing(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    world_size = dist.get_world_size()
+    device = get_device(local_rank)
+    times = get_init_times()
+
+    # The first collective bootstraps the communicator, the second shows the steady state
+    tensor = torch.ones(1, device=device)
+    for phase in ['first_collective', 'second_collective']:
+        start = time.perf_counter()
+        dist.all_reduce(tensor)
+        if args.device == 'gpu':
+            get_accelerator().synchronize()
+        times[phase] = time.perf_counter() - start
+
+    # The job waits for the slowest rank, so report the maximum next to the mean
+    phases = list(times)
+    max_times = torch.tensor([times[phase] for phase in phases], dtype=torch.float64, device=device)
+    sum_times = max_times.clone()
+    dist.all_reduce(max_times, op=dist.ReduceOp.MAX)
+    dist.all_reduce(sum_times)
+    max_times = max_times.tolist()
+    mean_times = [t / world_size for t in sum_times.tolist()]
+
+    nodes = world_size // max(get_local_world_size(), 1)
+    print_rank_0(f"\n---- Performance of init on {world_size} devices ({nodes} nodes) "
+                 "---------------------------------------------------------")
+    print_rank_0(f"{'Phase':20s} {'Max (s)':20s} {'Mean (s)':20s}")
+    print_rank_0("----------------------------------------------------------------------------------------------------")
+    for phase, max_time, mean_time in zip(phases, max_times, mean_times):
+        print_rank_0(f"{phase:20s} {max_time:<20.6f} {mean_time:<20.6f}")
+
+    if args.json_output and dist.get_rank() == 0:
+        record = {'op': 'init', 'world_size': world_size, 'nodes': nodes}
+        for phase, max_time, mean_time in zip(phases, max_times, mean_times):
+            record[f'{phase}_s'] = max_time
+            record[f'{phase}_mean_s'] = mean_time
+        with open(args.json_output, 'a') as fp:
+            fp.write(json.dumps(record) + '\n')
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_init_timing(local_rank=rank, args=args)
@@ -0,0 +1,86 @@
+# Fits the Hockney (alpha-beta) model T(n) = alpha + beta * n to the --scan
+# results written with --json-output. Plain Python, so that it can run as a
+# post-processing step outside the PyTorch container.
+
+import argparse
+import json
+from collections import OrderedDict
+
+# Fields that identify one curve in the results file
+CURVE_KEYS = ('op', 'dtype', 'world_size', 'group_class')
+
+
+def fit_alpha_beta(sizes, durations):
+    """
+    Weighted least squares fit of duration = alpha + beta * size. Weighting by
+    1/duration^2 minimises the relative error, so the small sizes still
+    determine alpha while the large ones determine beta. Returns (alpha, beta).
+    """
+    weights = [1 / t**2 for t in durations]
+    sw = sum(weights)
+    sx = sum(w * n for w, n in zip(weights, sizes))
+    sy = sum(w * t for w, t in zip(weights, durations))
+    sxx = sum(w * n * n for w, n in zip(weights, sizes))
+    sxy = sum(w * n * t for w, n, t in zip(weights, sizes, durations))
+    det = sw * sxx - sx * sx
+    alpha = (sxx * sy - sx * sxy) / det
+    beta = (sw * sxy - sx * sy) / det
+    return alpha, beta
+
+
+def fit_curves(records):
+    curves = OrderedDict()
+    for record in records:
+        key = tuple(record.get(k) for k in CURVE_KEYS)
+        curves.setdefault(key, []).append(record)
+
+    fits = []
+    for key, points in curves.items():
+        if len(points) < 2:
+            continue
+        sizes = [p['size'] for p in points]
+        # The median is more robust than the mean when --trial-stats was enabled
+        durations = [p.get('p50_us', p['duration_us']) * 1e-6 for p in points]
+        alpha, beta = fit_alpha_beta(sizes, durations)
+
+        # busbw = factor * size / duration for every point; the factor holds the op's bus bandwidth math
+        factor = points[-1]['busbw'] * points[-1]['duration_us'] * 1e-6 / points[-1]['size']
+        fit = OrderedDict((k, v) for k, v in zip(CURVE_KEYS, key) if v is not None)
+        fit['points'] = len(points)
+        fit['alpha_us'] = alpha * 1e6
+        # Without a positive slope there is no asymptotic bandwidth, written as null
+        fit['busbw'] = factor / beta if beta > 0 else None
+        fit['bw_unit'] = points[-1]['bw_unit']
+        # Size at which the bandwidth reaches half of the asymptotic one
+        fit['n_half'] = alpha / beta if beta > 0 else None
+        fits.append(fit)
+    return fits
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit the alpha-beta model to communication benchmark results')
+    parser.add_argument('results', help='JSON lines file written with --json-output')
+    parser.add_argument('--output', type=str, default=None, help='Write one JSON record per fitted curve to this file')
+    args = parser.parse_args()
+
+    with open(args.results) as fp:
+        records = [json.loads(line) for line in fp if line.strip()]
+    fits = fit_curves(records)
+
+    print("\n---- Alpha-beta model fit ----------------------------------------------------------------------------")
+    print(f"{'Op':20s} {'Devices':10s} {'Points':8s} {'Alpha (us)':15s} {'BusBW':20s} {'n_half (Bytes)':15s}")
+    print("----------------------------------------------------------------------------------------------------")
+    for fit in fits:
+        op = fit['op'] + (f" ({fit['group_class']})" if 'group_class' in fit else '')
+        busbw = f"{fit['busbw']:.3f} {fit['bw_unit']}" if fit['busbw'] is not None else '-'
+        n_half = f"{fit['n_half']:.0f}" if fit['n_half'] is not None else '-'
+        print(f"{op:20s} {fit['world_size']:<10d} {fit['points']:<8d} {fit['alpha_us']:<15.3f} {busbw:20s} {n_half:15s}")
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            for fit in fits:
+                fp.write(json.dumps(fit) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+# Run args.streams concurrent collectives, one per process group and stream, and print metrics
+def timed_multi_stream(inputs, outputs, groups, streams, args):
+    comm_fn = get_comm_fn(args.stream_op, args)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        for s, stream in enumerate(streams):
+            with torch.cuda.stream(stream):
+                comm_fn(outputs[s], inputs[s], groups[s])
+    sync_all()
+
+    start_event = torch.cuda.Event(enable_timing=True)
+    end_event = torch.cuda.Event(enable_timing=True)
+    stream_events = [(torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True)) for s in streams]
+
+    # time the actual comm op trials times and average it
+    start_event.record()
+    for s, stream in enumerate(streams):
+        stream.wait_event(start_event)
+        stream_events[s][0].record(stream)
+    # Interleave the streams so that every stream always has an op in flight
+    for i in range(args.trials):
+        for s, stream in enumerate(streams):
+            with torch.cuda.stream(stream):
+                comm_fn(outputs[s], inputs[s], groups[s])
+    for s, stream in enumerate(streams):
+        stream_events[s][1].record(stream)
+        torch.cuda.current_stream().wait_stream(stream)
+    end_event.record()
+    sync_all()
+
+    # maintain and clean performance data
+    avg_duration = start_event.elapsed_time(end_event) / 1000 / args.trials
+    size = inputs[0].element_size() * inputs[0].nelement()
+    # The streams together move len(streams) messages per trial
+    tput, busbw = get_bw(args.stream_op, size * len(streams), avg_duration, args)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    desc = f'{inputs[0].nelement()}x{inputs[0].element_size()}'
+
+    stream_busbw = []
+    for stream_start, stream_end in stream_events:
+        stream_duration = stream_start.elapsed_time(stream_end) / 1000 / args.trials
+        stream_busbw.append(get_bw(args.stream_op, size, stream_duration, args)[1] / 1e9)
+    stream_busbw_str = ''.join(f' {bw:<20.3f}' for bw in stream_busbw)
+
+    write_result(args,
+                 args.stream_op,
+                 inputs[0],
+                 avg_duration,
+                 None,
+                 tput,
+                 busbw,
+                 streams=len(streams),
+                 stream_busbw=stream_busbw)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" + stream_busbw_str)
+
+
+def run_multi_stream(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    if args.device == 'cpu':
+        print_rank_0('--multi-stream needs an accelerator, skipping it with --device cpu')
+        return
+
+    # Prepare benchmark header, the aggregate columns are followed by the bus bandwidth of each stream
+    print_header(args,
+                 f'{args.streams} concurrent {args.stream_op}',
+                 extra_columns=[f'Stream {s} BusBW ({args.bw_unit})' for s in range(args.streams)])
+
+    world_size = dist.get_world_size()
+    global_rank = dist.get_rank()
+    device = get_device(local_rank)
+    dtype = getattr(torch, args.dtype)
+
+    # Every stream gets its own communicator
+    groups = get_stream_groups(args.streams)
+    streams = [torch.cuda.Stream() for s in range(args.streams)]
+
+    if args.scan:
+        # Sizes whose buffers fit into the free memory, one set per stream
+        M_LIST = scan_sizes(args.stream_op, dtype, local_rank, args, buffers=args.streams)
+    else:
+        # Send the biggest message size our GPUs can fit, shared between the streams
+        elements_per_gpu = max_numel(comm_op=args.stream_op,
+                                     dtype=dtype,
+                                     mem_factor=args.mem_factor / args.streams,
+                                     local_rank=local_rank,
+                                     args=args)
+        M_LIST = [elements_per_gpu // world_size]
+
+    sync_all()
+    # loop over various tensor sizes
+    for M in M_LIST:
+        inputs = []
+        outputs = []
+        try:
+            for s in range(args.streams):
+                inputs.append(torch.empty(world_size * M, dtype=dtype, device=device).fill_(float(global_rank)))
+                if output_numel(args.stream_op, world_size * M, world_size) is not None:
+                    outputs.append(
+                        torch.empty(output_numel(args.stream_op, world_size * M, world_size), dtype=dtype,
+                                    device=device))
+                else:
+                    outputs.append(None)
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                sync_all()
+                break
+            else:
+                raise e
+        sync_all()
+        timed_multi_stream(inputs, outputs, groups, streams, args)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_multi_stream, local_rank=rank, args=args, topology=False)
@@ -0,0 +1,161 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def time_on_streams(work, start_event, end_event, args):
+    """
+    Times args.trials steps of work, a list of (stream, fn). Every step forks all
+    streams off the current stream and joins them again, like a training step.
+    """
+
+    def step():
+        current_stream = torch.cuda.current_stream()
+        for stream, fn in work:
+            stream.wait_stream(current_stream)
+            with torch.cuda.stream(stream):
+                fn()
+        for stream, fn in work:
+            current_stream.wait_stream(stream)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        step()
+    sync_all()
+
+    return time_trials(step, start_event, end_event, args)
+
+
+# Run a GEMM and a collective alone and overlapped on separate streams, and print metrics
+def timed_overlap(input, output, gemm_a, gemm_b, gemm_c, start_event, end_event, args):
+    comm_fn = get_comm_fn(args.overlap_op, args)
+    comm_stream = torch.cuda.Stream()
+    compute_stream = torch.cuda.Stream()
+    comm_work = (comm_stream, lambda: comm_fn(output, input, None))
+    gemm_work = (compute_stream, lambda: torch.matmul(gemm_a, gemm_b, out=gemm_c))
+
+    comm_duration, stats = time_on_streams([comm_work], start_event, end_event, args)
+    gemm_duration, _ = time_on_streams([gemm_work], start_event, end_event, args)
+    overlap_duration, _ = time_on_streams([gemm_work, comm_work], start_event, end_event, args)
+
+    # 1 when the shorter of the two is completely hidden, 0 when they run one after the other
+    overlap_efficiency = (comm_duration + gemm_duration - overlap_duration) / min(comm_duration, gemm_duration)
+    gemm_tflops = 2 * args.gemm_size**3 / gemm_duration / 1e12
+
+    # maintain and clean performance data
+    size = input.element_size() * input.nelement()
+    tput, busbw = get_bw(args.overlap_op, size, comm_duration, args)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, comm_duration)
+    desc = f'{input.nelement()}x{input.element_size()}'
+
+    write_result(args,
+                 args.overlap_op,
+                 input,
+                 comm_duration,
+                 stats,
+                 tput,
+                 busbw,
+                 gemm_size=args.gemm_size,
+                 gemm_dtype=str(gemm_c.dtype).replace('torch.', ''),
+                 gemm_us=gemm_duration * 1e6,
+                 gemm_tflops=gemm_tflops,
+                 overlap_us=overlap_duration * 1e6,
+                 overlap_efficiency=overlap_efficiency)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, comm_duration) +
+                 f" {gemm_duration * 1e6:<20.3f} {overlap_duration * 1e6:<20.3f} {overlap_efficiency:<20.3f}")
+
+
+def run_overlap(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    if args.device == 'cpu':
+        print_rank_0('--overlap needs an accelerator, skipping it with --device cpu')
+        return
+
+    # Prepare benchmark header, the columns up to the bus bandwidth are for the collective alone
+    print_header(args,
+                 f'{args.overlap_op} overlapped with a {args.gemm_size}^3 GEMM',
+                 extra_columns=['GEMM (us)', 'Overlapped (us)', 'Overlap efficiency'])
+
+    world_size = dist.get_world_size()
+    global_rank = dist.get_rank()
+    device = get_device(local_rank)
+    dtype = getattr(torch, args.dtype)
+
+    start_event = torch.cuda.Event(enable_timing=True)
+    end_event = torch.cuda.Event(enable_timing=True)
+
+    # matmul has no integer kernels, so integer dtypes only apply to the communication buffers
+    gemm_dtype = dtype if dtype.is_floating_point else torch.bfloat16
+    try:
+        gemm_a = torch.randn(args.gemm_size, args.gemm_size, device=device).to(gemm_dtype)
+        gemm_b = torch.randn(args.gemm_size, args.gemm_size, device=device).to(gemm_dtype)
+        gemm_c = torch.empty(args.gemm_size, args.gemm_size, dtype=gemm_dtype, device=device)
+    except RuntimeError as e:
+        if 'out of memory' in str(e):
+            if dist.get_rank() == 0:
+                print('WARNING: Ran out of GPU memory. Try to reduce the --gemm-size argument!')
+            sync_all()
+            return
+        else:
+            raise e
+
+    if args.scan:
+        # Sizes whose buffers fit into the memory left by the GEMM operands
+        M_LIST = scan_sizes(args.overlap_op, dtype, local_rank, args)
+    else:
+        # Send the biggest message size our GPUs can fit next to the GEMM operands
+        elements_per_gpu = max_numel(comm_op=args.overlap_op,
+                                     dtype=dtype,
+                                     mem_factor=args.mem_factor,
+                                     local_rank=local_rank,
+                                     args=args)
+        M_LIST = [elements_per_gpu // world_size]
+
+    sync_all()
+    # loop over various tensor sizes
+    for M in M_LIST:
+        try:
+            input = torch.empty(world_size * M, dtype=dtype, device=device).fill_(float(global_rank))
+            output = None
+            if output_numel(args.overlap_op, world_size * M, world_size) is not None:
+                output = torch.empty(output_numel(args.overlap_op, world_size * M, world_size),
+                                     dtype=dtype,
+                                     device=device)
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                sync_all()
+                break
+            else:
+                raise e
+        sync_all()
+        timed_overlap(input, output, gemm_a, gemm_b, gemm_c, start_event, end_event, args)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_overlap, local_rank=rank, args=args, topology=False)
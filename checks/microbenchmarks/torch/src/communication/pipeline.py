@@ -0,0 +1,221 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def stage_rank(pipeline, stage, num_stages, num_pipelines, args):
+    # Global rank of a stage: packed keeps a pipeline on consecutive ranks, spread strides it over the nodes
+    if args.placement == 'packed':
+        return pipeline * num_stages + stage
+    return stage * num_pipelines + pipeline
+
+
+def p2p(sends, recvs):
+    """
+    Issues one batch of isend/irecv, (tensor, peer) pairs, and waits for it, like the p2p
+    communication of pipeline engines. P2POp batching is a torch.distributed API, which
+    deepspeed.comm also initialises underneath.
+    """
+    ops = [torch.distributed.P2POp(torch.distributed.isend, tensor, peer) for tensor, peer in sends]
+    ops += [torch.distributed.P2POp(torch.distributed.irecv, tensor, peer) for tensor, peer in recvs]
+    if not ops:
+        return
+    for request in torch.distributed.batch_isend_irecv(ops):
+        request.wait()
+
+
+def one_f_one_b(stage, num_stages, buffers, prev_rank, next_rank, args, steady_events=None):
+    """
+    The p2p traffic of one 1F1B step of args.micro_batches without the compute: warm-up
+    forwards, steady state with one forward and one backward per micro-batch, cool-down
+    backwards. Combined send/recv batches as in Megatron-LM keep neighbours matched.
+    steady_events, a (start, end) event pair, are recorded around the steady state.
+    """
+    fwd_send, fwd_recv, bwd_send, bwd_recv = buffers
+    send_forward = [] if next_rank is None else [(fwd_send, next_rank)]
+    recv_forward = [] if prev_rank is None else [(fwd_recv, prev_rank)]
+    send_backward = [] if prev_rank is None else [(bwd_send, prev_rank)]
+    recv_backward = [] if next_rank is None else [(bwd_recv, next_rank)]
+
+    warmup = min(num_stages - stage - 1, args.micro_batches)
+    remaining = args.micro_batches - warmup
+    for i in range(warmup):
+        p2p([], recv_forward)
+        p2p(send_forward, [])
+    if remaining > 0:
+        p2p([], recv_forward)
+    if steady_events is not None:
+        steady_events[0].record()
+    for i in range(remaining):
+        p2p(send_forward, recv_backward)
+        if i == remaining - 1:
+            p2p(send_backward, [])
+        else:
+            p2p(send_backward, recv_forward)
+    if steady_events is not None:
+        steady_events[1].record()
+    for i in range(warmup):
+        p2p([], recv_backward)
+        p2p(send_backward, [])
+
+
+# Run the 1F1B traffic of all pipelines at once and every hop on its own, and print metrics
+def timed_pipeline(buffers, stage, pipeline, num_stages, num_pipelines, start_event, end_event, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    local_world_size = max(get_local_world_size(), 1)
+    ranks = [stage_rank(pipeline, s, num_stages, num_pipelines, args) for s in range(num_stages)]
+    prev_rank = ranks[stage - 1] if stage > 0 else None
+    next_rank = ranks[stage + 1] if stage < num_stages - 1 else None
+
+    def comm_fn():
+        one_f_one_b(stage, num_stages, buffers, prev_rank, next_rank, args)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        comm_fn()
+    sync_all()
+
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
+
+    # The steady state alone, without the warm-up and cool-down bubbles. Every stage runs
+    # micro_batches - warm-up micro-batches in it, the slowest stage sets the rate.
+    steady_events = [(new_event(), new_event()) for i in range(args.trials)]
+    for events in steady_events:
+        one_f_one_b(stage, num_stages, buffers, prev_rank, next_rank, args, steady_events=events)
+    sync_all()
+    steady_microbatches = args.micro_batches - min(num_stages - stage - 1, args.micro_batches)
+    steady_duration = torch.zeros(1, dtype=torch.float64, device=buffers[0].device)
+    if steady_microbatches > 0:
+        steady_duration[0] = sum(steady_start.elapsed_time(steady_end) / 1000
+                                 for steady_start, steady_end in steady_events) / args.trials / steady_microbatches
+    dist.all_reduce(steady_duration, op=dist.ReduceOp.MAX)
+    steady_duration = steady_duration.item()
+
+    # One forward activation per hop, all pipelines at once; the receiver's time counts
+    fwd_send, fwd_recv = buffers[:2]
+    hop_durations = torch.zeros(num_stages - 1, dtype=torch.float64, device=fwd_send.device)
+    for hop in range(num_stages - 1):
+
+        def hop_fn():
+            if stage == hop:
+                dist.send(fwd_send, ranks[hop + 1])
+            elif stage == hop + 1:
+                dist.recv(fwd_recv, ranks[hop])
+
+        hop_duration = time_trials(hop_fn, start_event, end_event, args)[0]
+        if stage == hop + 1:
+            hop_durations[hop] = hop_duration
+    # Slowest pipeline per hop
+    dist.all_reduce(hop_durations, op=dist.ReduceOp.MAX)
+    hop_us = [duration * 1e6 for duration in hop_durations.tolist()]
+    hop_class = [
+        'intra-node' if stage_rank(0, hop, num_stages, num_pipelines, args) // local_world_size ==
+        stage_rank(0, hop + 1, num_stages, num_pipelines, args) // local_world_size else 'inter-node'
+        for hop in range(num_stages - 1)
+    ]
+
+    # Every stage boundary carries a forward activation and a backward gradient per steady-state micro-batch
+    size = fwd_send.element_size() * fwd_send.nelement()
+    tput, busbw = get_bw('pt2pt', 2 * size, steady_duration, args)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    microbatch_rate = 1 / steady_duration
+    desc = f'{fwd_send.nelement()}x{fwd_send.element_size()}'
+
+    write_result(args,
+                 'pipeline',
+                 fwd_send,
+                 avg_duration,
+                 stats,
+                 tput,
+                 busbw,
+                 stages=num_stages,
+                 micro_batches=args.micro_batches,
+                 placement=args.placement,
+                 microbatch_rate=microbatch_rate,
+                 steady_us=steady_duration * 1e6,
+                 hop_us=hop_us,
+                 hop_class=hop_class)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, avg_duration) +
+                 f" {microbatch_rate:<20.1f} {min(hop_us):<20.3f} {max(hop_us):<20.3f}")
+
+
+def run_pipeline(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    world_size = dist.get_world_size()
+    global_rank = dist.get_rank()
+    num_stages = args.stages or world_size
+    if num_stages < 2 or world_size % num_stages != 0:
+        print_rank_0(f"cannot split {world_size} ranks into pipelines of {num_stages} stages")
+        return
+    num_pipelines = world_size // num_stages
+    for pipeline in range(num_pipelines):
+        for stage in range(num_stages):
+            if stage_rank(pipeline, stage, num_stages, num_pipelines, args) == global_rank:
+                my_pipeline, my_stage = pipeline, stage
+
+    # Prepare benchmark header
+    print_header(args,
+                 f'pipeline ({num_pipelines}x{num_stages} stages {args.placement}, {args.micro_batches} micro-batches)',
+                 extra_columns=['Micro-batches/s', 'Hop min (us)', 'Hop max (us)'])
+    device = get_device(local_rank)
+    dtype = getattr(torch, args.dtype)
+
+    start_event = new_event()
+    end_event = new_event()
+
+    # The largest activation that fits, four buffers of it
+    max_m = max_numel(comm_op='pt2pt', dtype=dtype, mem_factor=args.mem_factor / 4, local_rank=local_rank, args=args)
+    if args.scan:
+        M_LIST = [2**p for p in range(1, args.maxsize) if 2**p <= max_m]
+    else:
+        M_LIST = [max_m]
+
+    sync_all()
+    # loop over various activation sizes
+    for M in M_LIST:
+        try:
+            # Forward send/recv and backward send/recv buffers, reused by all micro-batches
+            buffers = [torch.empty(M, dtype=dtype, device=device).fill_(float(global_rank)) for i in range(4)]
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                sync_all()
+                break
+            else:
+                raise e
+        sync_all()
+        timed_pipeline(buffers, my_stage, my_pipeline, num_stages, num_pipelines, start_event, end_event, args)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_pipeline, local_rank=rank, args=args, topology=False)
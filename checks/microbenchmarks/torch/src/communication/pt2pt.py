@@ -35,36 +35,33 @@ def timed_pt2pt(input, start_event, end_event, args):
                 dist.recv(input, src=0)
     sync_all()
 
-    # time the actual comm op trials times and average it
-    start_event.record()
-    for i in range(args.trials):
+    def comm_fn():
         if dist.get_rank() == 0:
             if args.async_op:
-                dist.isend(input, 1)
+                return dist.isend(input, 1)
             else:
                 dist.send(input, 1)
         if dist.get_rank() == 1:
             if args.async_op:
-                dist.irecv(input, src=0)
+                return dist.irecv(input, src=0)
             else:
                 dist.recv(input, src=0)
 
-    end_event.record()
-    sync_all()
-    duration = start_event.elapsed_time(end_event) / 1000
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
 
     # maintain and clean performance data
-    avg_duration = duration / args.trials
     size = input.element_size() * input.nelement()
-    n = dist.get_world_size()
     tput, busbw = get_bw('pt2pt', size, avg_duration, args)
     tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
     desc = f'{input.nelement()}x{input.element_size()}'
 
+    write_result(args, 'pt2pt', input, avg_duration, stats, tput, busbw)
+
     if not args.raw:
         size = convert_size(size)
 
-    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}")
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" + get_stats_string(args, stats, avg_duration))
 
 
 def run_pt2pt(local_rank, args):
@@ -78,24 +75,35 @@ def run_pt2pt(local_rank, args):
     global_rank = dist.get_rank()
     world_size = dist.get_world_size()
 
-    start_event = torch.cuda.Event(enable_timing=True)
-    end_event = torch.cuda.Event(enable_timing=True)
+    start_event = new_event()
+    end_event = new_event()
 
     if args.scan:
-        # Create list of message sizes
-        M_LIST = []
-        for x in (2**p for p in range(1, args.maxsize)):
-            M_LIST.append(x)
-
+        # Sizes whose buffers fit into the free memory
+        M_LIST = scan_sizes('pt2pt', getattr(torch, args.dtype), local_rank, args)
+
+        if args.preallocate and M_LIST:
+            arena_input, _ = alloc_scan_buffers('pt2pt',
+                                                getattr(torch, args.dtype),
+                                                local_rank,
+                                                args,
+                                                max_m=M_LIST[-1])
+
+        setup_time = 0
+        comm_time = 0
         sync_all()
         # loop over various tensor sizes
         for M in M_LIST:
+            setup_start = time.perf_counter()
             global_rank = dist.get_rank()
             try:
-                mat = torch.ones(world_size, M,
-                                 dtype=getattr(torch, args.dtype)).to(get_accelerator().device_name(local_rank))
-                sync_all()
-                input = ((mat.mul_(float(global_rank))).view(-1))
+                if args.preallocate:
+                    input = scan_view(arena_input, world_size * M).fill_(float(global_rank))
+                else:
+                    mat = torch.ones(world_size, M,
+                                     dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
+                    sync_all()
+                    input = ((mat.mul_(global_rank)).view(-1))
             except RuntimeError as e:
                 if 'out of memory' in str(e):
                     if dist.get_rank() == 0:
@@ -105,7 +113,11 @@ def run_pt2pt(local_rank, args):
                 else:
                     raise e
             sync_all()
+            comm_start = time.perf_counter()
+            setup_time += comm_start - setup_start
             timed_pt2pt(input, start_event, end_event, args)
+            comm_time += time.perf_counter() - comm_start
+        print_scan_times(setup_time, comm_time)
     else:
         # Send the biggest message size our GPUs can fit. If you're facing OOM errors, reduce the mem_factor
         # Don't need output tensor, so double mem_factor
@@ -116,8 +128,8 @@ def run_pt2pt(local_rank, args):
                                      args=args)
         try:
             mat = torch.ones(elements_per_gpu, dtype=getattr(torch,
-                                                             args.dtype)).to(get_accelerator().device_name(local_rank))
-            input = ((mat.mul_(float(global_rank))).view(-1))
+                                                             args.dtype)).to(get_device(local_rank))
+            input = ((mat.mul_(global_rank)).view(-1))
         except RuntimeError as e:
             if 'out of memory' in str(e):
                 if dist.get_rank() == 0:
@@ -132,4 +144,4 @@ if __name__ == "__main__":
     args = benchmark_parser().parse_args()
     rank = args.local_rank
     init_processes(local_rank=rank, args=args)
-    run_pt2pt(local_rank=rank, args=args)
+    run_comm_op(run_pt2pt, local_rank=rank, args=args, topology=False)
@@ -0,0 +1,209 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os, time, math
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.utils import _percentile
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def pair_schedule(world_size):
+    """
+    Round-robin (circle method) schedule: every round is a list of disjoint rank pairs, and
+    the world_size - 1 rounds (world_size for an odd count) together cover every pair once.
+    """
+    n = world_size + world_size % 2
+    ranks = list(range(n))
+    rounds = []
+    for r in range(n - 1):
+        pairs = [(ranks[i], ranks[n - 1 - i]) for i in range(n // 2)]
+        # The extra rank of an odd world size is a bye
+        rounds.append([(a, b) for a, b in pairs if a < world_size and b < world_size])
+        ranks = [ranks[0]] + [ranks[-1]] + ranks[1:-1]
+    return rounds
+
+
+# Time args.trials sends in one direction of pair and return the average duration on this rank
+def timed_pair(input, pair, sender, start_event, end_event, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    global_rank = dist.get_rank()
+    src, dst = pair if sender == 0 else pair[::-1]
+
+    def comm_fn():
+        if global_rank == src:
+            dist.send(input, dst)
+        elif global_rank == dst:
+            dist.recv(input, src=src)
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        comm_fn()
+    sync_all()
+
+    # Every rank times, so that all of them take part in the barriers of time_trials
+    avg_duration, _ = time_trials(comm_fn, start_event, end_event, args)
+    return avg_duration
+
+
+def measure_round(inputs, round_pairs, start_event, end_event, durations, args):
+    """
+    Runs both directions of every pair of one round concurrently, for every message size in
+    inputs, and stores the receiver's duration in durations[size][src][dst].
+    """
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    global_rank = dist.get_rank()
+    my_pair = None
+    for pair in round_pairs:
+        if global_rank in pair:
+            my_pair = pair
+
+    for size, input in inputs.items():
+        for sender in (0, 1):
+            if my_pair is None:
+                # Idle this round, but the barriers still need us
+                timed_pair(input, (-1, -1), sender, start_event, end_event, args)
+                continue
+            duration = timed_pair(input, my_pair, sender, start_event, end_event, args)
+            src, dst = my_pair if sender == 0 else my_pair[::-1]
+            if global_rank == dst:
+                durations[size][src][dst] = duration
+
+
+def flag_pairs(bw, lat, pair_class, args):
+    """
+    Returns the pairs whose bandwidth is below --matrix-threshold times, or whose latency is
+    above 1 / --matrix-threshold times, the --matrix-percentile value of their pair class.
+    """
+    flagged = []
+    for cls in sorted(set(pair_class.values())):
+        pairs = [pair for pair in pair_class if pair_class[pair] == cls]
+        bw_ref = _percentile(sorted(bw[pair] for pair in pairs), args.matrix_percentile)
+        lat_ref = _percentile(sorted(lat[pair] for pair in pairs), 100 - args.matrix_percentile)
+        for pair in pairs:
+            if bw[pair] < args.matrix_threshold * bw_ref or lat[pair] > lat_ref / args.matrix_threshold:
+                flagged.append(pair)
+    return flagged
+
+
+def print_matrix(title, matrix, world_size):
+    print_rank_0(f"\n---- {title} ----------------------------------------------------------------------------")
+    print_rank_0(f"{'src/dst':>10s}" + ''.join(f" {dst:>9d}" for dst in range(world_size)))
+    for src in range(world_size):
+        row = ''.join(f" {'-':>9s}" if value is None else f" {value:>9.2f}" for value in matrix[src])
+        print_rank_0(f"{src:>10d}" + row)
+
+
+def run_pt2pt_matrix(local_rank, args):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    world_size = dist.get_world_size()
+    local_world_size = max(get_local_world_size(), 1)
+    dtype = getattr(torch, args.dtype)
+    element_size = torch.tensor([], dtype=dtype).element_size()
+    device = get_device(local_rank)
+
+    print_rank_0(f"\n---- Performance of pt2pt matrix on {world_size} devices "
+                 f"({args.matrix_latency_size} and {args.matrix_bw_size} Bytes) ----------------------------")
+
+    start_event = new_event()
+    end_event = new_event()
+
+    # Latency at the small size, bandwidth at the large one
+    sizes = [args.matrix_latency_size, args.matrix_bw_size]
+    inputs = {size: torch.ones(max(size // element_size, 1), dtype=dtype, device=device) for size in sizes}
+    durations = {size: [[0.0] * world_size for src in range(world_size)] for size in sizes}
+
+    rounds = pair_schedule(world_size)
+    round_start = time.perf_counter()
+    measure_round(inputs, rounds[0], start_event, end_event, durations, args)
+    # The slowest rank decides, so that all ranks select the same rounds
+    round_time = torch.tensor([time.perf_counter() - round_start], dtype=torch.float64, device=device)
+    dist.all_reduce(round_time, op=dist.ReduceOp.MAX)
+    round_time = round_time.item()
+
+    # Spread the rounds that fit into --matrix-budget evenly over the schedule
+    selected = list(range(1, len(rounds)))
+    if args.matrix_budget and round_time * len(rounds) > args.matrix_budget:
+        stride = math.ceil(len(rounds) * round_time / args.matrix_budget)
+        selected = selected[stride - 1::stride]
+        print_rank_0(f"Measuring {len(selected) + 1} of {len(rounds)} rounds to fit in {args.matrix_budget} s")
+    for r in selected:
+        measure_round(inputs, rounds[r], start_event, end_event, durations, args)
+
+    # Every receiver filled its own column, sum them up
+    reduced = {}
+    for size in sizes:
+        tensor = torch.tensor(durations[size], dtype=torch.float64, device=device)
+        dist.all_reduce(tensor)
+        reduced[size] = tensor.tolist()
+
+    lat = {}
+    bw = {}
+    pair_class = {}
+    for src in range(world_size):
+        for dst in range(world_size):
+            if src == dst or reduced[args.matrix_bw_size][src][dst] == 0:
+                continue
+            lat[(src, dst)] = reduced[args.matrix_latency_size][src][dst]
+            bw[(src, dst)] = get_bw('pt2pt', args.matrix_bw_size, reduced[args.matrix_bw_size][src][dst], args)[1]
+            same_node = src // local_world_size == dst // local_world_size
+            pair_class[(src, dst)] = 'intra-node' if same_node else 'inter-node'
+    if not bw:
+        print_rank_0("No pairs measured")
+        return
+    flagged = set(flag_pairs(bw, lat, pair_class, args))
+
+    bw_matrix = [[bw[(src, dst)] / 1e9 if (src, dst) in bw else None for dst in range(world_size)]
+                 for src in range(world_size)]
+    lat_matrix = [[lat[(src, dst)] * 1e6 if (src, dst) in lat else None for dst in range(world_size)]
+                  for src in range(world_size)]
+    print_matrix(f"Bandwidth ({args.bw_unit}) at {args.matrix_bw_size} Bytes", bw_matrix, world_size)
+    print_matrix(f"Latency (us) at {args.matrix_latency_size} Bytes", lat_matrix, world_size)
+
+    print_rank_0(f"\nFlagged pairs: {len(flagged)} of {len(bw)} measured")
+    for src, dst in sorted(flagged):
+        print_rank_0(f"{src:>6d} -> {dst:<6d} {pair_class[(src, dst)]:12s} "
+                     f"{bw[(src, dst)] / 1e9:.3f} {args.bw_unit} {lat[(src, dst)] * 1e6:.3f} us")
+
+    for pair in bw:
+        for size, duration in ((args.matrix_latency_size, lat[pair]),
+                               (args.matrix_bw_size, reduced[args.matrix_bw_size][pair[0]][pair[1]])):
+            tput, busbw = get_bw('pt2pt', size, duration, args)
+            write_result(args,
+                         'pt2pt_matrix',
+                         inputs[size],
+                         duration,
+                         None,
+                         tput,
+                         busbw,
+                         src=pair[0],
+                         dst=pair[1],
+                         pair_class=pair_class[pair],
+                         flagged=pair in flagged)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_pt2pt_matrix, local_rank=rank, args=args, topology=False)
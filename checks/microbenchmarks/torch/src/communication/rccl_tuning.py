@@ -0,0 +1,84 @@
+# Picks the fastest RCCL configuration per message size band from --json-output files
+# of runs with different NCCL_* settings (recorded in tuning_env). Plain Python, so that
+# it can run as a post-processing step outside the PyTorch container.
+
+import argparse
+import json
+from collections import OrderedDict
+
+# Bands of message sizes in bytes, [lower, upper)
+SIZE_BANDS = [0, 65536, 1048576, 16777216, 268435456, float('inf')]
+
+
+def config_label(tuning_env):
+    return ' '.join(f'{var}={value}' for var, value in sorted(tuning_env.items())) or 'default'
+
+
+def size_band(size):
+    for lower, upper in zip(SIZE_BANDS[:-1], SIZE_BANDS[1:]):
+        if lower <= size < upper:
+            return lower, upper
+
+
+def best_configs(records, ranks_per_node):
+    """
+    For every op, dtype, node count and size band, averages the bus bandwidth of each
+    configuration over the sizes in the band and returns the fastest configuration, with
+    its gain over the slowest one.
+    """
+    bands = OrderedDict()
+    for record in records:
+        key = (record['op'], record['dtype'], record['world_size'] // ranks_per_node) + size_band(record['size'])
+        config = config_label(record.get('tuning_env', {}))
+        bands.setdefault(key, OrderedDict()).setdefault(config, (record.get('tuning_env', {}), []))[1].append(
+            record['busbw'])
+
+    best = []
+    for (op, dtype, nodes, lower, upper), configs in bands.items():
+        mean_busbw = {config: sum(values) / len(values) for config, (env, values) in configs.items()}
+        fastest = max(mean_busbw, key=mean_busbw.get)
+        slowest = min(mean_busbw, key=mean_busbw.get)
+        best.append(
+            OrderedDict([
+                ('op', op),
+                ('dtype', dtype),
+                ('nodes', nodes),
+                ('size_min', lower),
+                ('size_max', upper if upper != float('inf') else None),
+                ('configs', len(configs)),
+                ('tuning_env', configs[fastest][0]),
+                ('busbw', mean_busbw[fastest]),
+                ('gain', mean_busbw[fastest] / mean_busbw[slowest] if mean_busbw[slowest] > 0 else float('inf')),
+            ]))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pick the fastest RCCL configuration per message size band')
+    parser.add_argument('results', nargs='+', help='JSON lines files written with --json-output')
+    parser.add_argument('--ranks-per-node', type=int, default=8, help='Ranks per node of the runs')
+    parser.add_argument('--output', type=str, default=None, help='Write one JSON record per band to this file')
+    args = parser.parse_args()
+
+    records = []
+    for results in args.results:
+        with open(results) as fp:
+            records += [json.loads(line) for line in fp if line.strip()]
+    best = best_configs(records, args.ranks_per_node)
+
+    print("\n---- Fastest RCCL configuration per size band -------------------------------------------------------")
+    print(f"{'Op':15s} {'Nodes':6s} {'Sizes (Bytes)':25s} {'BusBW':10s} {'Gain':6s} Configuration")
+    print("----------------------------------------------------------------------------------------------------")
+    for band in best:
+        sizes = f"{band['size_min']}-{band['size_max'] or ''}"
+        print(f"{band['op']:15s} {band['nodes']:<6d} {sizes:25s} {band['busbw']:<10.3f} {band['gain']:<6.2f} "
+              f"{config_label(band['tuning_env'])}")
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            for band in best:
+                fp.write(json.dumps(band) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os, time
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+
+
+def timed_reduce(input, start_event, end_event, args, group=None, dst=None):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    if dst is None:
+        dst = get_group_root(group)
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        dist.reduce(input, dst, group=group, async_op=args.async_op)
+    sync_all()
+
+    def comm_fn():
+        return dist.reduce(input, dst, group=group, async_op=args.async_op)
+
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
+
+    # maintain and clean performance data
+    size = input.element_size() * input.nelement()
+    tput, busbw = get_bw('reduce', size, avg_duration, args, group=group)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    desc = f'{input.nelement()}x{input.element_size()}'
+
+    root_fields = get_root_fields(dst, args)
+    write_result(args, 'reduce', input, avg_duration, stats, tput, busbw, group=group, **root_fields)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" +
+                 get_stats_string(args, stats, avg_duration) + get_root_string(root_fields))
+
+
+def run_reduce(local_rank, args, group=None, group_class=None):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    # Prepare benchmark header
+    print_header(args, 'reduce', group=group, group_class=group_class, extra_columns=get_root_header(args))
+
+    world_size = dist.get_world_size()
+    global_rank = dist.get_rank()
+
+    start_event = new_event()
+    end_event = new_event()
+
+    if args.scan:
+        # Sizes whose buffers fit into the free memory
+        M_LIST = scan_sizes('reduce', getattr(torch, args.dtype), local_rank, args, group=group)
+
+        if args.preallocate and M_LIST:
+            arena_input, _ = alloc_scan_buffers('reduce',
+                                                getattr(torch, args.dtype),
+                                                local_rank,
+                                                args,
+                                                group=group,
+                                                max_m=M_LIST[-1])
+
+        setup_time = 0
+        comm_time = 0
+        sync_all()
+        # loop over various tensor sizes
+        for M in M_LIST:
+            setup_start = time.perf_counter()
+            global_rank = dist.get_rank()
+            try:
+                if args.preallocate:
+                    input = scan_view(arena_input, world_size * M).fill_(float(global_rank))
+                else:
+                    mat = torch.ones(world_size, M,
+                                     dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
+                    sync_all()
+                    input = ((mat.mul_(global_rank)).view(-1))
+            except RuntimeError as e:
+                if 'out of memory' in str(e):
+                    if dist.get_rank() == 0:
+                        print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                    sync_all()
+                    break
+                else:
+                    raise e
+            sync_all()
+            comm_start = time.perf_counter()
+            setup_time += comm_start - setup_start
+            for dst in get_roots(args, group=group):
+                timed_reduce(input, start_event, end_event, args, group=group, dst=dst)
+            comm_time += time.perf_counter() - comm_start
+        print_scan_times(setup_time, comm_time)
+    else:
+        # Send the biggest message size our GPUs can fit. If you're facing OOM errors, reduce the mem_factor
+        # Don't need output tensor, so we double mem_factor
+        elements_per_gpu = max_numel(comm_op='reduce',
+                                     dtype=getattr(torch, args.dtype),
+                                     mem_factor=args.mem_factor * 2,
+                                     local_rank=local_rank,
+                                     args=args)
+        try:
+            mat = torch.ones(elements_per_gpu, dtype=getattr(torch,
+                                                             args.dtype)).to(get_device(local_rank))
+            input = ((mat.mul_(global_rank)).view(-1))
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Try to reduce the --mem-factor argument!')
+                sync_all()
+                return
+        sync_all()
+        for dst in get_roots(args, group=group):
+            timed_reduce(input, start_event, end_event, args, group=group, dst=dst)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_reduce, local_rank=rank, args=args)
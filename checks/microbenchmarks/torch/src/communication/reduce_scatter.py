@@ -0,0 +1,146 @@
+# Copyright (c) Microsoft Corporation.
+# SPDX-License-Identifier: Apache-2.0
+
+# DeepSpeed Team
+
+import torch
+import sys, os, time
+
+COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
+sys.path.append(COMMS_BENCH_DIR)
+
+from communication.utils import *
+from communication.constants import *
+from deepspeed.accelerator import get_accelerator
+from deepspeed.comm import TorchBackend
+
+
+# Run reduce_scatter and print metrics
+def timed_reduce_scatter(input, output, start_event, end_event, args, group=None):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+
+        reduce_scatter_func = TorchBackend.get_reduce_scatter_function()
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+        reduce_scatter_func = dist.reduce_scatter_fn
+
+    sync_all()
+    # Warmups, establish connections, etc.
+    for i in range(args.warmups):
+        reduce_scatter_func(output, input, group=group, async_op=args.async_op)
+    sync_all()
+
+    def comm_fn():
+        return reduce_scatter_func(output, input, group=group, async_op=args.async_op)
+
+    # time the actual comm op trials times and average it
+    avg_duration, stats = time_trials(comm_fn, start_event, end_event, args)
+
+    # maintain and clean performance data
+    size = input.element_size() * input.nelement()
+    tput, busbw = get_bw('reduce_scatter', size, avg_duration, args, group=group)
+    tput_str, busbw_str, duration_str = get_metric_strings(args, tput, busbw, avg_duration)
+    desc = f'{input.nelement()}x{input.element_size()}'
+
+    write_result(args, 'reduce_scatter', input, avg_duration, stats, tput, busbw, group=group)
+
+    if not args.raw:
+        size = convert_size(size)
+
+    print_rank_0(f"{size:<20} {desc:25s} {duration_str:20s} {tput_str:20s} {busbw_str:20s}" + get_stats_string(args, stats, avg_duration))
+
+
+def run_reduce_scatter(local_rank, args, group=None, group_class=None):
+    if args.dist == 'torch':
+        import torch.distributed as dist
+    elif args.dist == 'deepspeed':
+        import deepspeed.comm as dist
+
+    # Prepare benchmark header
+    print_header(args, 'reduce_scatter', group=group, group_class=group_class)
+    global_rank = dist.get_rank()
+    world_size = dist.get_world_size()
+    group_size = dist.get_world_size(group=group)
+
+    start_event = new_event()
+    end_event = new_event()
+
+    if args.scan:
+        # Sizes whose buffers fit into the free memory
+        M_LIST = scan_sizes('reduce_scatter', getattr(torch, args.dtype), local_rank, args, group=group)
+
+        if args.preallocate and M_LIST:
+            arena_input, arena_output = alloc_scan_buffers('reduce_scatter',
+                                                           getattr(torch, args.dtype),
+                                                           local_rank,
+                                                           args,
+                                                           group=group,
+                                                           max_m=M_LIST[-1])
+
+        setup_time = 0
+        comm_time = 0
+        sync_all()
+        # loop over various tensor sizes
+        for M in M_LIST:
+            setup_start = time.perf_counter()
+            global_rank = dist.get_rank()
+            try:
+                if args.preallocate:
+                    input = scan_view(arena_input, world_size * M).fill_(float(global_rank))
+                    output = scan_view(arena_output, world_size * M // group_size)
+                else:
+                    mat = torch.ones(world_size, M,
+                                     dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
+                    sync_all()
+                    input = ((mat.mul_(global_rank)).view(-1))
+                    output = torch.zeros(world_size * M // group_size,
+                                         dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
+            except RuntimeError as e:
+                if 'out of memory' in str(e):
+                    if dist.get_rank() == 0:
+                        print('WARNING: Ran out of GPU memory. Exiting comm op.')
+                    sync_all()
+                    break
+                else:
+                    raise e
+            sync_all()
+            comm_start = time.perf_counter()
+            setup_time += comm_start - setup_start
+            timed_reduce_scatter(input, output, start_event, end_event, args, group=group)
+            comm_time += time.perf_counter() - comm_start
+        print_scan_times(setup_time, comm_time)
+    else:
+        # Send the biggest message size our GPUs can fit. If you're facing OOM errors, reduce the mem_factor
+        # The output tensor is only 1/group_size of the input, so we double mem_factor like all_reduce
+        elements_per_gpu = max_numel(comm_op='reduce_scatter',
+                                     dtype=getattr(torch, args.dtype),
+                                     mem_factor=args.mem_factor * 2,
+                                     local_rank=local_rank,
+                                     args=args)
+        try:
+            mat = torch.ones(elements_per_gpu, dtype=getattr(torch,
+                                                             args.dtype)).to(get_device(local_rank))
+            # multiply each GPU's tensor by the rank to ease debugging
+            input = ((mat.mul_(global_rank)).view(-1))
+            output = torch.zeros(elements_per_gpu // group_size,
+                                 dtype=getattr(torch, args.dtype)).to(get_device(local_rank))
+        except RuntimeError as e:
+            if 'out of memory' in str(e):
+                if dist.get_rank() == 0:
+                    print('WARNING: Ran out of GPU memory. Try to reduce the --mem-factor argument!')
+                sync_all()
+                return
+            else:
+                raise e
+
+        sync_all()
+        timed_reduce_scatter(input, output, start_event, end_event, args, group=group)
+
+
+if __name__ == "__main__":
+    args = benchmark_parser().parse_args()
+    rank = args.local_rank
+    init_processes(local_rank=rank, args=args)
+    run_comm_op(run_reduce_scatter, local_rank=rank, args=args)
@@ -12,8 +12,19 @@ from communication.utils import *
 from communication.all_reduce import run_all_reduce
 from communication.all_gather import run_all_gather
 from communication.all_to_all import run_all_to_all
+from communication.all_to_all_uneven import run_all_to_all_uneven
 from communication.pt2pt import run_pt2pt
 from communication.broadcast import run_broadcast
+from communication.reduce import run_reduce
+from communication.reduce_scatter import run_reduce_scatter
+from communication.pt2pt_matrix import run_pt2pt_matrix
+from communication.pipeline import run_pipeline
+from communication.ddp_buckets import run_ddp_buckets
+from communication.multi_stream import run_multi_stream
+from communication.overlap import run_overlap
+from communication.graph_latency import run_graph_latency
+from communication.hier_all_reduce import run_hier_all_reduce
+from communication.coalesced import run_coalesced
 from communication.constants import *
 
 
@@ -29,25 +40,72 @@ def main(args, rank):
         ops_to_run.append('all_gather')
     if args.broadcast:
         ops_to_run.append('broadcast')
+    if args.reduce:
+        ops_to_run.append('reduce')
     if args.pt2pt:
         ops_to_run.append('pt2pt')
     if args.all_to_all:
         ops_to_run.append('all_to_all')
+    if args.reduce_scatter:
+        ops_to_run.append('reduce_scatter')
+    if args.all_to_all_uneven:
+        ops_to_run.append('all_to_all_uneven')
+    if args.pt2pt_matrix:
+        ops_to_run.append('pt2pt_matrix')
+    if args.pipeline:
+        ops_to_run.append('pipeline')
+    if args.ddp_buckets:
+        ops_to_run.append('ddp_buckets')
+    if args.multi_stream:
+        ops_to_run.append('multi_stream')
+    if args.overlap:
+        ops_to_run.append('overlap')
+    if args.graph:
+        ops_to_run.append('graph')
+    if args.hier_all_reduce:
+        ops_to_run.append('hier_all_reduce')
+    if args.coalesced:
+        ops_to_run.append('coalesced')
 
     if len(ops_to_run) == 0:
         ops_to_run = ['all_reduce', 'all_gather', 'all_to_all', 'broadcast', 'pt2pt']
 
     for comm_op in ops_to_run:
         if comm_op == 'all_reduce':
-            run_all_reduce(local_rank=rank, args=args)
+            run_comm_op(run_all_reduce, local_rank=rank, args=args)
         if comm_op == 'all_gather':
-            run_all_gather(local_rank=rank, args=args)
+            run_comm_op(run_all_gather, local_rank=rank, args=args)
         if comm_op == 'all_to_all':
-            run_all_to_all(local_rank=rank, args=args)
+            run_comm_op(run_all_to_all, local_rank=rank, args=args)
+        if comm_op == 'all_to_all_uneven':
+            run_comm_op(run_all_to_all_uneven, local_rank=rank, args=args)
+        # pt2pt always runs between global ranks 0 and 1, --group-topology does not apply
         if comm_op == 'pt2pt':
-            run_pt2pt(local_rank=rank, args=args)
+            run_comm_op(run_pt2pt, local_rank=rank, args=args, topology=False)
         if comm_op == 'broadcast':
-            run_broadcast(local_rank=rank, args=args)
+            run_comm_op(run_broadcast, local_rank=rank, args=args)
+        if comm_op == 'reduce':
+            run_comm_op(run_reduce, local_rank=rank, args=args)
+        if comm_op == 'reduce_scatter':
+            run_comm_op(run_reduce_scatter, local_rank=rank, args=args)
+        # pt2pt_matrix, pipeline, ddp_buckets, multi_stream, overlap, graph, hier_all_reduce and coalesced are
+        # modes on top of another op, so they only run when asked for
+        if comm_op == 'pt2pt_matrix':
+            run_comm_op(run_pt2pt_matrix, local_rank=rank, args=args, topology=False)
+        if comm_op == 'pipeline':
+            run_comm_op(run_pipeline, local_rank=rank, args=args, topology=False)
+        if comm_op == 'ddp_buckets':
+            run_comm_op(run_ddp_buckets, local_rank=rank, args=args, topology=False)
+        if comm_op == 'multi_stream':
+            run_comm_op(run_multi_stream, local_rank=rank, args=args, topology=False)
+        if comm_op == 'overlap':
+            run_comm_op(run_overlap, local_rank=rank, args=args, topology=False)
+        if comm_op == 'graph':
+            run_comm_op(run_graph_latency, local_rank=rank, args=args, topology=False)
+        if comm_op == 'hier_all_reduce':
+            run_comm_op(run_hier_all_reduce, local_rank=rank, args=args, topology=False)
+        if comm_op == 'coalesced':
+            run_comm_op(run_coalesced, local_rank=rank, args=args, topology=False)
 
 
 # For directly calling benchmark
@@ -5,7 +5,10 @@
 
 import torch
 import os, sys
+import re
 import math
+import time
+import json
 import argparse
 
 COMMS_BENCH_DIR = os.path.join(os.path.dirname(__file__), "../")
@@ -15,6 +18,12 @@ from deepspeed.accelerator import get_accelerator
 
 global dist
 
+# 'gpu' or 'cpu', set from --device by init_processes
+_device_type = 'gpu'
+
+# Wall time in seconds of each init_torch_distributed phase on this rank
+_init_times = {}
+
 
 def env2int(env_list, default=-1):
     for e in env_list:
@@ -23,13 +32,27 @@ def env2int(env_list, default=-1):
     return default
 
 
+def first_slurm_host(nodelist):
+    # First host of a compressed Slurm node list, e.g. nid005001 for nid[005001-005004,005010]
+    prefix, ranges, suffix = re.match(r'([^,\[]+)(?:\[([^\]]+)\])?([^,]*)', nodelist).groups()
+    if ranges is None:
+        return prefix
+    return prefix + ranges.split(',')[0].split('-')[0] + suffix
+
+
 def init_torch_distributed(backend):
     global dist
     import torch.distributed as dist
 
+    start = time.perf_counter()
     # discover rank/size info from env
     if 'MASTER_PORT' not in os.environ:
         os.environ['MASTER_PORT'] = str(TORCH_DISTRIBUTED_DEFAULT_PORT)
+    nodelist = os.environ.get('SLURM_STEP_NODELIST', os.environ.get('SLURM_JOB_NODELIST'))
+    if 'MASTER_ADDR' not in os.environ and nodelist is not None:
+        # Every rank derives the same address, no launcher or mpi4py round trip needed. The step
+        # node list comes first, a step can run on a subset of the allocation.
+        os.environ['MASTER_ADDR'] = first_slurm_host(nodelist)
     if 'MASTER_ADDR' not in os.environ:
         try:
             from mpi4py import MPI
@@ -58,10 +81,46 @@ def init_torch_distributed(backend):
     world_size = env2int(['WORLD_SIZE', 'OMPI_COMM_WORLD_SIZE', 'MV2_COMM_WORLD_SIZE', 'SLURM_NPROCS'])
     if 'WORLD_SIZE' not in os.environ:
         os.environ['WORLD_SIZE'] = str(world_size)
-
-    torch.distributed.init_process_group(backend)
     local_rank = int(os.environ['LOCAL_RANK'])
-    get_accelerator().set_device(local_rank)
+    if _device_type == 'gpu':
+        get_accelerator().set_device(local_rank)
+    _init_times['env'] = time.perf_counter() - start
+
+    # Same TCP store rendezvous as env://, done explicitly so that it can be timed on its own.
+    # The store waits as long as init_process_group does by default, like the one env:// creates.
+    try:
+        from torch.distributed.distributed_c10d import _get_default_timeout
+        timeout = _get_default_timeout(backend)
+    except ImportError:
+        from torch.distributed.constants import default_pg_timeout as timeout
+    start = time.perf_counter()
+    if os.environ.get('TORCHELASTIC_USE_AGENT_STORE') == 'True':
+        # Under torchrun the agent already serves the store on MASTER_PORT, connect to it as env:// does
+        store = dist.TCPStore(os.environ['MASTER_ADDR'],
+                              int(os.environ['MASTER_PORT']),
+                              int(os.environ['WORLD_SIZE']),
+                              False,
+                              timeout=timeout)
+        store = dist.PrefixStore(f"/worker/attempt_{os.environ.get('TORCHELASTIC_RESTART_COUNT', '0')}", store)
+    else:
+        store = dist.TCPStore(os.environ['MASTER_ADDR'],
+                              int(os.environ['MASTER_PORT']),
+                              int(os.environ['WORLD_SIZE']),
+                              int(os.environ['RANK']) == 0,
+                              timeout=timeout)
+    _init_times['rendezvous'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    torch.distributed.init_process_group(backend,
+                                         store=store,
+                                         rank=int(os.environ['RANK']),
+                                         world_size=int(os.environ['WORLD_SIZE']),
+                                         timeout=timeout)
+    _init_times['process_group'] = time.perf_counter() - start
+
+
+def get_init_times():
+    return dict(_init_times)
 
 
 def init_deepspeed_comm(backend):
@@ -70,10 +129,16 @@ def init_deepspeed_comm(backend):
     import deepspeed.comm as dist
     deepspeed.init_distributed(dist_backend=backend)
     local_rank = int(os.environ['LOCAL_RANK'])
-    get_accelerator().set_device(local_rank)
+    if _device_type == 'gpu':
+        get_accelerator().set_device(local_rank)
 
 
 def init_processes(local_rank, args):
+    global _device_type
+    _device_type = args.device
+    # The window waits on the work handles, which only async ops return
+    if args.window:
+        args.async_op = True
     if args.dist == 'deepspeed':
         init_deepspeed_comm(args.backend)
     elif args.dist == 'torch':
@@ -88,24 +153,173 @@ def print_rank_0(message):
         print(message)
 
 
-def print_header(args, comm_op):
+def get_local_world_size():
+    local_world_size = env2int(['LOCAL_WORLD_SIZE', 'OMPI_COMM_WORLD_LOCAL_SIZE', 'MPI_LOCALNRANKS', 'SLURM_NTASKS_PER_NODE'])
+    if local_world_size < 0:
+        local_world_size = get_accelerator().device_count() if _device_type == 'gpu' else 1
+    return local_world_size
+
+
+_topology_groups = None
+
+
+def get_topology_groups():
+    """
+    Returns [(group_class, group)] for this rank: the node-local group of ranks sharing a node
+    and the inter-node group of ranks with the same local rank. Assumes ranks are placed on
+    nodes in contiguous blocks, as srun and torchrun do by default.
+    """
+    global _topology_groups
+    if _topology_groups is not None:
+        return _topology_groups
+
+    world_size = dist.get_world_size()
+    global_rank = dist.get_rank()
+    local_world_size = get_local_world_size()
+    if local_world_size <= 0 or world_size % local_world_size != 0:
+        print_rank_0(f"cannot split {world_size} ranks into nodes of {local_world_size} ranks")
+        exit(0)
+    num_nodes = world_size // local_world_size
+
+    # new_group must be called by all ranks for every group, in the same order
+    for node in range(num_nodes):
+        group = dist.new_group(ranks=list(range(node * local_world_size, (node + 1) * local_world_size)))
+        if global_rank // local_world_size == node:
+            intra_group = group
+    for local_rank in range(local_world_size):
+        group = dist.new_group(ranks=list(range(local_rank, world_size, local_world_size)))
+        if global_rank % local_world_size == local_rank:
+            inter_group = group
+
+    _topology_groups = [('intra-node', intra_group), ('inter-node', inter_group)]
+    return _topology_groups
+
+
+_stream_groups = []
+
+
+def get_stream_groups(num_streams):
+    """
+    Returns num_streams process groups over all ranks, one communicator per stream, as
+    concurrent collectives have in production. The groups are created once and reused by
+    every --dtypes run, since communicators are not freed until the process group is.
+    """
+    world_size = dist.get_world_size()
+    # new_group must be called by all ranks for every group, in the same order
+    while len(_stream_groups) < num_streams:
+        _stream_groups.append(dist.new_group(ranks=list(range(world_size))))
+    return _stream_groups[:num_streams]
+
+
+def get_dtypes(args):
+    if args.dtypes is None:
+        return [args.dtype]
+    dtypes = args.dtypes.split(',')
+    for dtype in dtypes:
+        if not isinstance(getattr(torch, dtype, None), torch.dtype):
+            print_rank_0(f"{dtype} is not a PyTorch dtype")
+            exit(0)
+    return dtypes
+
+
+def run_comm_op(run_fn, local_rank, args, topology=True):
+    """
+    Runs the op once per --dtypes entry in the already initialised process group. With
+    --group-topology (and topology=True), every run happens concurrently on all node-local
+    groups, then on all inter-node groups.
+    """
+    default_dtype = args.dtype
+    for dtype in get_dtypes(args):
+        args.dtype = dtype
+        if not (topology and args.group_topology):
+            run_fn(local_rank=local_rank, args=args)
+            continue
+        for group_class, group in get_topology_groups():
+            run_fn(local_rank=local_rank, args=args, group=group, group_class=group_class)
+    args.dtype = default_dtype
+
+
+def get_group_class(group):
+    # Class of a --group-topology group, None for the world group
+    for group_class, topology_group in (_topology_groups or []):
+        if group is topology_group:
+            return group_class
+    return None
+
+
+def get_group_root(group):
+    # Global rank of the first rank of group, as expected by the src/dst arguments
+    if group is None:
+        return 0
+    return dist.get_global_rank(group, 0)
+
+
+def get_roots(args, group=None):
+    """
+    Global ranks to use as src/dst of rooted ops in turn: the group root, all ranks of the
+    group with --rotate-root all, or with --rotate-root node one rank per node of the group,
+    whose local rank steps with the node where the group has that rank. Every group of a
+    --group-topology class spans as many nodes, so all of them run the same number of roots
+    and stay in step at the barriers.
+    """
+    if args.rotate_root == 'none':
+        return [get_group_root(group)]
+    group_size = dist.get_world_size(group=group)
+    ranks = [rank if group is None else dist.get_global_rank(group, rank) for rank in range(group_size)]
+    if args.rotate_root == 'all':
+        return ranks
+    local_world_size = get_local_world_size()
+    roots = {}
+    for rank in ranks:
+        node = rank // local_world_size
+        if node not in roots or rank % local_world_size == node % local_world_size:
+            roots[node] = rank
+    return list(roots.values())
+
+
+def get_root_fields(root, args):
+    # Placement of a rotated root for write_result, nothing without --rotate-root
+    if args.rotate_root == 'none':
+        return {}
+    local_world_size = get_local_world_size()
+    return {'root': root, 'root_node': root // local_world_size, 'root_local_rank': root % local_world_size}
+
+
+def get_root_header(args):
+    return ['Root (node, local)'] if args.rotate_root != 'none' else []
+
+
+def get_root_string(root_fields):
+    if not root_fields:
+        return ''
+    root = f"{root_fields['root']} ({root_fields['root_node']}, {root_fields['root_local_rank']})"
+    return f" {root:20s}"
+
+
+def print_header(args, comm_op, group=None, group_class=None, extra_columns=()):
     if comm_op == 'pt2pt':
         world_size = 2
     else:
-        world_size = dist.get_world_size()
+        world_size = dist.get_world_size(group=group)
     tput = f'Throughput ({args.bw_unit})'
     busbw = f'BusBW ({args.bw_unit})'
-    header = f"\n---- Performance of {comm_op} on {world_size} devices ---------------------------------------------------------\n"
+    devices = f'{world_size} devices'
+    if args.dtypes is not None:
+        devices += f' ({args.dtype})'
+    if group_class is not None:
+        devices += f' ({group_class} groups)'
+    header = f"\n---- Performance of {comm_op} on {devices} ---------------------------------------------------------\n"
     duration_str = 'Duration'
     if args.raw:
         duration_str += ' (us)'
-    header += f"{'Size (Bytes)':20s} {'Description':25s} {duration_str:20s} {tput:20s} {busbw:20s}\n"
+    header += f"{'Size (Bytes)':20s} {'Description':25s} {duration_str:20s} {tput:20s} {busbw:20s}"
+    header += get_stats_header(args) + ''.join(f" {column:20s}" for column in extra_columns) + "\n"
     header += "----------------------------------------------------------------------------------------------------"
     print_rank_0(header)
 
 
-def get_bw(comm_op, size, duration, args):
-    n = dist.get_world_size()
+def get_bw(comm_op, size, duration, args, group=None):
+    n = dist.get_world_size(group=group)
     tput = 0
     busbw = 0
     if comm_op == "all_to_all":
@@ -115,10 +329,14 @@ def get_bw(comm_op, size, duration, args):
         size *= n
         tput = (size / duration)
         busbw = (size / duration) * ((n - 1) / n)
+    elif comm_op == "reduce_scatter":
+        # size is the full input, of which each rank keeps 1/n
+        tput = (size / duration)
+        busbw = (size / duration) * ((n - 1) / n)
     elif comm_op == "all_reduce":
         tput = (size * 2 / duration)
         busbw = (size / duration) * (2 * (n - 1) / n)
-    elif comm_op == "pt2pt" or comm_op == "broadcast":
+    elif comm_op == "pt2pt" or comm_op == "broadcast" or comm_op == "reduce":
         tput = (size / duration)
         busbw = tput
     else:
@@ -132,6 +350,60 @@ def get_bw(comm_op, size, duration, args):
     return tput, busbw
 
 
+def get_stats_header(args):
+    header = ''
+    if args.trial_stats or args.time_budget:
+        header += ''.join(f" {f'{stat.capitalize()} (us)':12s}" for stat in LATENCY_STATS)
+    if args.window:
+        header += f" {'Msg rate (1/s)':20s}"
+    return header
+
+
+def get_stats_string(args, stats, duration):
+    stats_str = ''
+    if stats is not None:
+        stats_str += ''.join(f" {stats[stat] * 1e6:<12.3f}" for stat in LATENCY_STATS)
+    if args.window:
+        stats_str += f" {1 / duration:<20.1f}"
+    return stats_str
+
+
+def write_result(args, comm_op, input, duration, stats, tput, busbw, group=None, **fields):
+    """
+    Appends the result for one message size as a JSON record to --json-output.
+    Durations are in us and bandwidths in --bw-unit, like the printed table.
+    """
+    if not args.json_output or dist.get_rank() != 0:
+        return
+    record = {
+        'op': comm_op,
+        'dtype': args.dtype,
+        'size': input.element_size() * input.nelement(),
+        'count': input.nelement(),
+        'world_size': dist.get_world_size(group=group),
+        'duration_us': duration * 1e6,
+    }
+    if stats is not None:
+        for stat in LATENCY_STATS:
+            record[f'{stat}_us'] = stats[stat] * 1e6
+        record['trials'] = stats['trials']
+        record['rel_ci'] = stats['rel_ci']
+    record['algbw'] = tput / 1e9
+    record['busbw'] = busbw / 1e9
+    record['bw_unit'] = args.bw_unit
+    if args.window:
+        record['window'] = args.window
+        record['msg_rate'] = 1 / duration
+    if get_group_class(group) is not None:
+        record['group_class'] = get_group_class(group)
+    tuning_env = {var: os.environ[var] for var in TUNING_ENV_VARS if var in os.environ}
+    if tuning_env:
+        record['tuning_env'] = tuning_env
+    record.update(fields)
+    with open(args.json_output, 'a') as fp:
+        fp.write(json.dumps(record) + '\n')
+
+
 def get_metric_strings(args, tput, busbw, duration):
     duration_ms = duration * 1e3
     duration_us = duration * 1e6
@@ -147,33 +419,307 @@ def get_metric_strings(args, tput, busbw, duration):
     return tput, busbw, duration
 
 
+class WallClockEvent:
+    """
+    Host stand-in for an accelerator timing event. Without --async-op the gloo and
+    mpi collectives on host tensors return when they are done, so the wall clock
+    between two records times them.
+    """
+
+    def __init__(self):
+        self.time = None
+
+    def record(self, stream=None):
+        self.time = time.perf_counter()
+
+    def elapsed_time(self, end_event):
+        # Milliseconds, like torch.cuda.Event.elapsed_time
+        return (end_event.time - self.time) * 1000
+
+
+def new_event():
+    if _device_type == 'cpu':
+        return WallClockEvent()
+    return torch.cuda.Event(enable_timing=True)
+
+
+def get_device(local_rank):
+    if _device_type == 'cpu':
+        return 'cpu'
+    return get_accelerator().device_name(local_rank)
+
+
+def empty_cache():
+    if _device_type == 'gpu':
+        get_accelerator().empty_cache()
+
+
 def sync_all():
-    get_accelerator().synchronize()
+    if _device_type == 'gpu':
+        get_accelerator().synchronize()
     dist.barrier()
 
 
+def time_trials(comm_fn, start_event, end_event, args):
+    """
+    Times args.trials calls of comm_fn. Returns the average duration in seconds and,
+    with --trial-stats, a dict of per-trial latency statistics (None otherwise).
+    With --time-budget the number of trials is chosen per message size instead. With
+    --window every trial is a window of ops, and durations are per op.
+    """
+    messages = 1
+    if args.window:
+        comm_fn = window_fn(comm_fn, args.window)
+        messages = args.window
+
+    if args.time_budget:
+        durations = time_adaptive_trials(comm_fn, args)
+    elif args.trial_stats:
+        durations = time_each_trial(comm_fn, args.trials)
+    else:
+        start_event.record()
+        for i in range(args.trials):
+            comm_fn()
+        end_event.record()
+        sync_all()
+        duration = start_event.elapsed_time(end_event) / 1000
+        return duration / args.trials / messages, None
+
+    durations = [duration / messages for duration in durations]
+    return sum(durations) / len(durations), get_duration_stats(durations)
+
+
+def window_fn(comm_fn, window):
+    """
+    Like the OSU window: issues window calls of comm_fn, then waits on all the work handles
+    they returned, so that a window of ops is in flight rather than one at a time.
+    """
+
+    def trial():
+        handles = [comm_fn() for i in range(window)]
+        for handle in handles:
+            if handle is not None:
+                handle.wait()
+
+    return trial
+
+
+def time_each_trial(comm_fn, trials):
+    # One event pair per trial, so that the tail is not averaged away
+    trial_events = [(new_event(), new_event()) for i in range(trials)]
+    for trial_start, trial_end in trial_events:
+        trial_start.record()
+        comm_fn()
+        trial_end.record()
+    sync_all()
+    return [trial_start.elapsed_time(trial_end) / 1000 for trial_start, trial_end in trial_events]
+
+
+def time_adaptive_trials(comm_fn, args):
+    """
+    Runs a short pilot, then as many more trials as the relative confidence interval
+    --target-ci needs, without exceeding --time-budget seconds or --max-trials.
+    Returns the durations of all trials, pilot included.
+    """
+    durations = time_each_trial(comm_fn, PILOT_TRIALS)
+    stats = get_duration_stats(durations)
+    mean = sum(durations) / len(durations)
+    if mean <= 0:
+        # Idle rank (e.g. outside the pt2pt pair) timing a no-op, nothing to converge
+        trials = PILOT_TRIALS
+    else:
+        # Trials needed for a half-width of target_ci * mean at CI_Z standard errors
+        needed = math.ceil((CI_Z * stats['stddev'] / (args.target_ci * mean))**2)
+        affordable = int(args.time_budget / mean)
+        trials = max(PILOT_TRIALS, min(needed, affordable, args.max_trials))
+
+    # Every rank must issue the same number of collectives, so follow the slowest to converge
+    remaining = torch.tensor([trials - PILOT_TRIALS], device=get_device(int(os.environ['LOCAL_RANK'])))
+    dist.all_reduce(remaining, op=dist.ReduceOp.MAX)
+    return durations + time_each_trial(comm_fn, int(remaining.item()))
+
+
+def get_duration_stats(durations):
+    durations = sorted(durations)
+    mean = sum(durations) / len(durations)
+    stddev = math.sqrt(sum((d - mean)**2 for d in durations) / len(durations))
+    stats = {
+        'min': durations[0],
+        'p50': _percentile(durations, 50),
+        'p90': _percentile(durations, 90),
+        'p99': _percentile(durations, 99),
+        'max': durations[-1],
+        'stddev': stddev,
+        'trials': len(durations),
+        # Half-width of the confidence interval of the mean, relative to the mean; 0 for no-ops of idle ranks
+        'rel_ci': CI_Z * stddev / math.sqrt(len(durations)) / mean if mean > 0 else 0.0,
+    }
+    return stats
+
+
+# Percentile of an already sorted list, linearly interpolated between closest ranks
+def _percentile(sorted_values, q):
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(math.floor(pos))
+    hi = int(math.ceil(pos))
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def get_free_memory(local_rank):
+    """
+    Bytes every rank can still allocate: free device memory plus what the caching allocator
+    holds without using it, minimum over all ranks so that they all pick the same sizes. On
+    CPU, the available host memory shared by the ranks on the node.
+    """
+    if _device_type == 'cpu':
+        free_memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES') // get_local_world_size()
+    else:
+        device = get_device(local_rank)
+        free_memory = torch.cuda.mem_get_info(device)[0]
+        free_memory += torch.cuda.memory_reserved(device) - torch.cuda.memory_allocated(device)
+    free_memory = torch.tensor([free_memory], dtype=torch.int64, device=get_device(local_rank))
+    dist.all_reduce(free_memory, op=dist.ReduceOp.MIN)
+    return int(free_memory.item())
+
+
+def memory_per_element(comm_op, group_size):
+    # Elements allocated per input element of comm_op: the input plus the output, if the op has one
+    return 1 + (output_numel(comm_op, group_size, group_size) or 0) / group_size
+
+
+def print_memory_plan(free_memory, used_memory):
+    print_rank_0(f"Memory per rank: {convert_size(free_memory)} free, {convert_size(used_memory)} for the largest "
+                 f"message, {convert_size(free_memory - used_memory)} headroom")
+
+
 def max_numel(comm_op, dtype, mem_factor, local_rank, args):
+    """
+    Input elements of the largest comm_op whose input and output buffers fit into mem_factor
+    of the free memory.
+    """
     dtype_size = _element_size(dtype)
-    max_memory_per_gpu = get_accelerator().total_memory(local_rank) * mem_factor
-    if comm_op == 'all_reduce' or comm_op == 'pt2pt' or comm_op == 'broadcast':
-        elements_per_gpu = int(max_memory_per_gpu // dtype_size)
+    world_size = dist.get_world_size()
+    free_memory = get_free_memory(local_rank)
+    max_memory_per_gpu = free_memory * mem_factor
+    elements_per_gpu = int(max_memory_per_gpu // (dtype_size * memory_per_element(comm_op, world_size)))
+    if comm_op == 'all_reduce' or comm_op == 'pt2pt' or comm_op == 'broadcast' or comm_op == 'reduce':
+        pass
     elif comm_op == 'all_gather':
-        # all_gather performance is lower for non-powers of two, and the output buffer size scales with world size
-        # Therefore, divide by world size and round down to nearest power of 2
-        elements_per_gpu = int(max_memory_per_gpu // dtype_size // dist.get_world_size())
+        # all_gather performance is lower for non-powers of two, round down to nearest power of 2
         elements_per_gpu = int(pow(2, int(math.log(elements_per_gpu, 2))))
     elif comm_op == 'all_to_all':
         # Number of elements must be divisible by world_size
         # all_to_all performance is lower for non-powers of two. Round down like all_gather.
-        elements_per_gpu = int(max_memory_per_gpu // dtype_size)
-        elements_per_gpu = int(dist.get_world_size() * round(elements_per_gpu / dist.get_world_size()))
+        elements_per_gpu = int(world_size * round(elements_per_gpu / world_size))
+        elements_per_gpu = int(pow(2, int(math.log(elements_per_gpu, 2))))
+    elif comm_op == 'reduce_scatter':
+        # The input must split into world_size equal shards. Round down to a power of 2 like all_to_all.
+        elements_per_gpu = int(world_size * round(elements_per_gpu / world_size))
         elements_per_gpu = int(pow(2, int(math.log(elements_per_gpu, 2))))
     else:
         print(f"This communication operation: {comm_op} is not supported yet")
         exit(0)
+    print_memory_plan(free_memory, elements_per_gpu * dtype_size * memory_per_element(comm_op, world_size))
     return elements_per_gpu
 
 
+def scan_sizes(comm_op, dtype, local_rank, args, group=None, buffers=1):
+    """
+    Returns the --scan values of M, world_size * M input elements each, up to --maxsize or the
+    largest whose input and output buffers fit into SCAN_MEM_FRACTION of the free memory,
+    whichever is smaller. Sizes that do not fit are left out up front with a warning instead
+    of running into an out-of-memory error in the middle of the scan. buffers is the number
+    of such input and output pairs that are allocated at the same time.
+    """
+    world_size = dist.get_world_size()
+    group_size = dist.get_world_size(group=group)
+    bytes_per_m = world_size * _element_size(dtype) * memory_per_element(comm_op, group_size) * buffers
+    free_memory = get_free_memory(local_rank)
+    M_LIST = [2**p for p in range(1, args.maxsize) if 2**p * bytes_per_m <= free_memory * SCAN_MEM_FRACTION]
+    if len(M_LIST) < args.maxsize - 1:
+        print_rank_0(f"WARNING: only {len(M_LIST)} of {args.maxsize - 1} sizes fit into the free memory")
+    if M_LIST:
+        print_memory_plan(free_memory, M_LIST[-1] * bytes_per_m)
+    return M_LIST
+
+
+def output_numel(comm_op, input_numel, group_size):
+    # Number of output elements of comm_op for a given input, None for in-place ops
+    if comm_op == 'all_gather':
+        return input_numel * group_size
+    elif comm_op == 'all_to_all':
+        return input_numel
+    elif comm_op == 'reduce_scatter':
+        return input_numel // group_size
+    return None
+
+
+def get_comm_fn(comm_op, args):
+    """
+    Returns a callable comm_fn(output, input, group) that issues one comm_op
+    with the framework selected by --dist.
+    """
+    from deepspeed.comm import TorchBackend
+    if args.dist == 'torch':
+        all_gather_func = TorchBackend.get_all_gather_function()
+        reduce_scatter_func = TorchBackend.get_reduce_scatter_function()
+    elif args.dist == 'deepspeed':
+        all_gather_func = dist.allgather_fn
+        reduce_scatter_func = dist.reduce_scatter_fn
+
+    if comm_op == 'all_reduce':
+        return lambda output, input, group: dist.all_reduce(input, group=group, async_op=args.async_op)
+    elif comm_op == 'all_gather':
+        return lambda output, input, group: all_gather_func(output, input, group=group, async_op=args.async_op)
+    elif comm_op == 'all_to_all':
+        return lambda output, input, group: dist.all_to_all_single(output, input, group=group, async_op=args.async_op)
+    elif comm_op == 'reduce_scatter':
+        return lambda output, input, group: reduce_scatter_func(output, input, group=group, async_op=args.async_op)
+    else:
+        print_rank_0(f"This communication operation: {comm_op} is not supported yet")
+        exit(0)
+
+
+def alloc_scan_buffers(comm_op, dtype, local_rank, args, group=None, max_m=None):
+    """
+    Allocates the --scan input (and, where the op needs one, output) buffer for the
+    largest message size, max_m from scan_sizes, once on the device. Each size then runs
+    on a view of it. Halves the capacity until the buffers fit; sizes above it are reported as OOM.
+    """
+    world_size = dist.get_world_size()
+    group_size = dist.get_world_size(group=group)
+    device = get_device(local_rank)
+    numel = world_size * (max_m or 2**(args.maxsize - 1))
+    while numel >= world_size:
+        try:
+            input = torch.empty(numel, dtype=dtype, device=device)
+            output = None
+            if output_numel(comm_op, numel, group_size) is not None:
+                output = torch.empty(output_numel(comm_op, numel, group_size), dtype=dtype, device=device)
+            return input, output
+        except RuntimeError as e:
+            if 'out of memory' not in str(e):
+                raise e
+            input = output = None
+            empty_cache()
+            numel //= 2
+    raise RuntimeError('out of memory: cannot preallocate scan buffers')
+
+
+def scan_view(buffer, numel):
+    # Zero-copy view of a preallocated scan buffer
+    if numel > buffer.nelement():
+        raise RuntimeError(f'out of memory: {numel} elements exceed the preallocated {buffer.nelement()}')
+    return buffer[:numel]
+
+
+def print_scan_times(setup_time, comm_time):
+    total_time = setup_time + comm_time
+    if total_time > 0:
+        print_rank_0(f"Scan time: setup {setup_time:.3f} s ({100 * setup_time / total_time:.1f}%), "
+                     f"communication {comm_time:.3f} s ({100 * comm_time / total_time:.1f}%)")
+
+
 # Helper function to pretty-print message sizes
 def convert_size(size_bytes):
     if size_bytes == 0:
@@ -211,28 +757,178 @@ def benchmark_parser():
     parser.add_argument("--warmups", type=int, default=DEFAULT_WARMUPS, help='Number of warmup (non-timed) iterations')
     parser.add_argument("--maxsize", type=int, default=24, help='Max message size as a power of 2')
     parser.add_argument("--async-op", action="store_true", help='Enables non-blocking communication')
+    parser.add_argument("--window",
+                        type=int,
+                        default=None,
+                        help='Keep this many async ops in flight per trial and report the message rate, implies --async-op')
+    parser.add_argument("--trial-stats",
+                        action="store_true",
+                        help='Time every trial separately and report min/p50/p90/p99/max/stddev latency')
+    parser.add_argument("--time-budget",
+                        type=float,
+                        default=None,
+                        help='Choose the trials per message size to fit in this many seconds, overrides --trials')
+    parser.add_argument("--target-ci",
+                        type=float,
+                        default=DEFAULT_TARGET_CI,
+                        help='Relative 95%% confidence interval of the mean to stop at with --time-budget')
+    parser.add_argument("--max-trials",
+                        type=int,
+                        default=DEFAULT_MAX_TRIALS,
+                        help='Upper limit of the trials per message size with --time-budget')
     parser.add_argument("--bw-unit", type=str, default=DEFAULT_UNIT, choices=['Gbps', 'GBps'])
     parser.add_argument("--backend",
                         type=str,
                         default=DEFAULT_BACKEND,
-                        choices=['nccl', 'ccl', 'mpi'],
+                        choices=['nccl', 'ccl', 'mpi', 'gloo'],
                         help='Communication library to use')
+    parser.add_argument("--device",
+                        type=str,
+                        default='gpu',
+                        choices=['gpu', 'cpu'],
+                        help='Run on the accelerator or on host tensors (with --backend gloo or mpi)')
     parser.add_argument("--dist",
                         type=str,
                         default=DEFAULT_DIST,
                         choices=['deepspeed', 'torch'],
                         help='Distributed DL framework to use')
     parser.add_argument("--scan", action="store_true", help='Enables scanning all message sizes')
+    parser.add_argument("--preallocate",
+                        action="store_true",
+                        help='Allocate the largest --scan buffers on the device once and use views of them per size')
+    parser.add_argument("--json-output",
+                        type=str,
+                        default=None,
+                        help='Append one JSON record per message size to this file')
     parser.add_argument("--raw", action="store_true", help='Print the message size and latency without units')
     parser.add_argument("--all-reduce", action="store_true", help='Run all_reduce')
     parser.add_argument("--all-gather", action="store_true", help='Run all_gather')
     parser.add_argument("--all-to-all", action="store_true", help='Run all_to_all')
     parser.add_argument("--pt2pt", action="store_true", help='Run pt2pt')
     parser.add_argument("--broadcast", action="store_true", help='Run broadcast')
+    parser.add_argument("--reduce", action="store_true", help='Run reduce')
+    parser.add_argument("--rotate-root",
+                        type=str,
+                        default='none',
+                        choices=['none', 'all', 'node'],
+                        help='Run broadcast and reduce from every rank or from one rank per node in turn')
+    parser.add_argument("--reduce-scatter", action="store_true", help='Run reduce_scatter')
+    parser.add_argument("--all-to-all-uneven", action="store_true", help='Run all_to_all with skewed, MoE-like splits')
+    parser.add_argument("--skew",
+                        type=str,
+                        default='zipf',
+                        choices=['uniform', 'zipf', 'hot'],
+                        help='Distribution of the --all-to-all-uneven splits over the destination ranks')
+    parser.add_argument("--zipf-alpha", type=float, default=1.2, help='Exponent of the zipf --skew')
+    parser.add_argument("--hot-fraction",
+                        type=float,
+                        default=0.5,
+                        help='Share of every rank\'s elements that go to the hot rank with --skew hot')
+    parser.add_argument("--seed", type=int, default=1234, help='Seed of the --all-to-all-uneven splits')
+    parser.add_argument("--pt2pt-matrix",
+                        action="store_true",
+                        help='Run pt2pt between every pair of ranks and flag the slow pairs')
+    parser.add_argument("--matrix-latency-size",
+                        type=int,
+                        default=DEFAULT_MATRIX_LATENCY_SIZE,
+                        help='Message size in bytes of the --pt2pt-matrix latencies')
+    parser.add_argument("--matrix-bw-size",
+                        type=int,
+                        default=DEFAULT_MATRIX_BW_SIZE,
+                        help='Message size in bytes of the --pt2pt-matrix bandwidths')
+    parser.add_argument("--matrix-budget",
+                        type=float,
+                        default=None,
+                        help='Measure only an evenly spread subset of the pair rounds that fits in this many seconds')
+    parser.add_argument("--matrix-percentile",
+                        type=float,
+                        default=50,
+                        help='Percentile of the node-local or inter-node pairs that --pt2pt-matrix compares against')
+    parser.add_argument("--matrix-threshold",
+                        type=float,
+                        default=0.8,
+                        help='Flag pairs below this fraction of the --matrix-percentile bandwidth (or above its inverse in latency)')
+    parser.add_argument("--pipeline",
+                        action="store_true",
+                        help='Run the 1F1B send/recv traffic of pipeline parallelism over all ranks')
+    parser.add_argument("--stages",
+                        type=int,
+                        default=None,
+                        help='Stages per --pipeline, the world size by default; the ranks form world size / stages pipelines')
+    parser.add_argument("--micro-batches",
+                        type=int,
+                        default=DEFAULT_MICRO_BATCHES,
+                        help='Micro-batches per --pipeline step')
+    parser.add_argument("--placement",
+                        type=str,
+                        default='packed',
+                        choices=['packed', 'spread'],
+                        help='Place the stages of a --pipeline on consecutive ranks or strided over the nodes')
+    parser.add_argument("--ddp-buckets",
+                        action="store_true",
+                        help='Replay the all_reduce buckets of one DDP step back to back')
+    parser.add_argument("--bucket-model",
+                        type=str,
+                        default='vit_b_16',
+                        help='torchvision model whose parameters give the --ddp-buckets sizes')
+    parser.add_argument("--bucket-profile",
+                        type=str,
+                        default=None,
+                        help='File with one --ddp-buckets size in bytes per line, overrides --bucket-model')
+    parser.add_argument("--bucket-cap-mb",
+                        type=float,
+                        default=DEFAULT_BUCKET_CAP_MB,
+                        help='DDP bucket_cap_mb used to split the --bucket-model parameters')
+    parser.add_argument("--multi-stream",
+                        action="store_true",
+                        help='Run --streams concurrent collectives, each on its own process group and stream')
+    parser.add_argument("--streams", type=int, default=DEFAULT_STREAMS, help='Number of concurrent streams')
+    parser.add_argument("--stream-op",
+                        type=str,
+                        default='all_reduce',
+                        choices=['all_reduce', 'all_gather', 'all_to_all', 'reduce_scatter'],
+                        help='Collective to run with --multi-stream')
+    parser.add_argument("--overlap",
+                        action="store_true",
+                        help='Run --overlap-op alone, a GEMM alone, and both overlapped on separate streams')
+    parser.add_argument("--overlap-op",
+                        type=str,
+                        default='all_reduce',
+                        choices=['all_reduce', 'reduce_scatter'],
+                        help='Collective to overlap with the GEMM')
+    parser.add_argument("--gemm-size",
+                        type=int,
+                        default=DEFAULT_GEMM_SIZE,
+                        help='Dimension of the square matrices multiplied with --overlap')
+    parser.add_argument("--graph",
+                        action="store_true",
+                        help='Time --graph-op eagerly and replayed from a HIP/CUDA graph')
+    parser.add_argument("--graph-op",
+                        type=str,
+                        default='all_reduce',
+                        choices=['all_reduce', 'all_gather', 'all_to_all', 'reduce_scatter'],
+                        help='Collective to capture with --graph')
+    parser.add_argument("--coalesced",
+                        action="store_true",
+                        help='All_reduce --num-tensors tensors as separate ops, coalesced and as one flat buffer')
+    parser.add_argument("--num-tensors",
+                        type=int,
+                        default=DEFAULT_NUM_TENSORS,
+                        help='Number of tensors of the --scan size all_reduced with --coalesced')
+    parser.add_argument("--hier-all-reduce",
+                        action="store_true",
+                        help='Run a two-level (node-local, then inter-node) all_reduce against the flat one')
+    parser.add_argument("--group-topology",
+                        action="store_true",
+                        help='Run collectives on node-local and on inter-node (same local rank) groups')
     parser.add_argument("--dtype", type=str, default=DEFAULT_TYPE, help='PyTorch tensor dtype')
+    parser.add_argument("--dtypes",
+                        type=str,
+                        default=None,
+                        help='Comma-separated PyTorch tensor dtypes to run one after the other, overrides --dtype')
     parser.add_argument("--mem-factor",
                         type=float,
                         default=.3,
-                        help='Proportion of max available GPU memory to use for single-size evals')
+                        help='Proportion of free GPU memory to use for single-size evals')
     parser.add_argument("--debug", action="store_true", help='Enables all_to_all debug prints')
     return parser
@@ -1,23 +1,87 @@
+import json
 import os
 import reframe as rfm
 import reframe.utility.sanity as sn
+from reframe.core.exceptions import SanityError
 
 
 # Codes used for the check are taken from: https://github.com/microsoft/DeepSpeedExamples/tree/master/benchmarks/communication commit 8e4cdd8
 
+# Results written by the benchmarks with --json-output, one JSON record per message size
+def read_comm_results(filename):
+    with open(filename) as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+@sn.deferrable
+def count_comm_results(filename):
+    return len(read_comm_results(filename))
+
+
+@sn.deferrable
+def extract_comm_result(filename, size, key, **match):
+    for record in read_comm_results(filename):
+        if record['size'] == size and all(record.get(k) == v for k, v in match.items()):
+            return record[key]
+    raise SanityError(f'no {key} for message size {size} in {filename}')
+
+
+@sn.deferrable
+def summarise_comm_results(filename, key, func, **match):
+    # func (e.g. min or sum) over key of all records that match
+    return func(record[key] for record in read_comm_results(filename)
+                if all(record.get(k) == v for k, v in match.items()))
+
+
+@sn.deferrable
+def extract_model_fit(filename, key, **match):
+    for record in read_comm_results(filename):
+        if all(record.get(k) == v for k, v in match.items()):
+            if record[key] is None:
+                # model_fit.py writes null where the durations do not grow with the size
+                raise SanityError(f'model fit in {filename} has no {key}: the fitted slope is not positive')
+            return record[key]
+    raise SanityError(f'no model fit with {key} in {filename}')
+
+
 class deepspeed_comm(rfm.RunOnlyRegressionTest):
     valid_systems = ['lumi:gpu']
     valid_prog_environs = ['builtin']
     sourcesdir = 'src'
     exclusive_access = True
 
+    results_file = variable(str, value='comm_results.jsonl')
+    # Alpha-beta model fitted to results_file after the run
+    model_file = variable(str, value='comm_model.jsonl')
+    # Message size (512 MB) of the headline throughput and latencies
+    perf_size = variable(int, value=536870912)
+
     perf_relative = variable(float, value=0.0, loggable=True)
 
+    def results_path(self):
+        return os.path.join(self.stagedir, self.results_file)
+
+    def model_path(self):
+        return os.path.join(self.stagedir, self.model_file)
+
+    @run_before('run')
+    def fit_model(self):
+        # Plain Python, runs on the host after the containerised benchmark
+        self.postrun_cmds = [
+            f'python3 communication/model_fit.py {self.results_file} --output {self.model_file}'
+        ]
+
+    def assert_scan_fits(self):
+        # scan_sizes drops the sizes that do not fit into the free memory, name that rather than the record count
+        return sn.assert_not_found(r'WARNING: only \d+ of \d+ sizes fit', self.stdout,
+                                   msg='--scan left out sizes that do not fit into the free GPU memory')
+
     @sanity_function
     def assert_job_is_complete(self):
         return sn.all([
             sn.assert_found(r'Performance of', self.stdout),
-            sn.assert_eq(sn.count( sn.findall('x4', self.stdout) ), 23),
+            self.assert_scan_fits(),
+            sn.assert_eq(count_comm_results(self.results_path()), 23),
         ])
 
     #@performance_function('ms')
@@ -29,10 +93,58 @@ class deepspeed_comm(rfm.RunOnlyRegressionTest):
 
     @performance_function('Gbps')
     def throughput(self):
-        return sn.extractsingle(
-            r'512\.0 MB\s+\S+\s+\S+\s+\S+\s+(?P<throughput>\S+)\s+\S+',
-            self.stdout, 'throughput', float
-        )
+        return extract_comm_result(self.results_path(), self.perf_size, 'algbw')
+
+    # Per-trial latencies, recorded with --trial-stats
+    @performance_function('us')
+    def latency_p50(self):
+        return extract_comm_result(self.results_path(), self.perf_size, 'p50_us')
+
+    @performance_function('us')
+    def latency_p99(self):
+        return extract_comm_result(self.results_path(), self.perf_size, 'p99_us')
+
+    # Relative half-width of the 95% confidence interval of the mean duration
+    @performance_function('')
+    def latency_rel_ci(self):
+        return extract_comm_result(self.results_path(), self.perf_size, 'rel_ci')
+
+    # Startup latency, asymptotic bus bandwidth and half-bandwidth message size
+    @performance_function('us')
+    def model_alpha(self):
+        return extract_model_fit(self.model_path(), 'alpha_us')
+
+    @performance_function('Gbps')
+    def model_busbw(self):
+        return extract_model_fit(self.model_path(), 'busbw')
+
+    @performance_function('B')
+    def model_n_half(self):
+        return extract_model_fit(self.model_path(), 'n_half')
+
+    @run_before('performance')
+    def set_size_perf_variables(self):
+        # One bus bandwidth per message size, to log the full curve; records without one (e.g. init) have no curve
+        records = [
+            record for record in read_comm_results(self.results_path()) if 'size' in record and 'busbw' in record
+        ]
+        multi_op = len({record['op'] for record in records}) > 1
+        multi_dtype = len({record['dtype'] for record in records}) > 1
+        for record in records:
+            parts = ['busbw']
+            if multi_op:
+                parts.append(record['op'])
+            if multi_dtype:
+                parts.append(record['dtype'])
+            if 'group_class' in record:
+                parts.append(record['group_class'])
+            if 'root' in record:
+                parts.append(f"root{record['root']}")
+            parts.append(str(record['size']))
+            name = '_'.join(parts)
+            self.perf_variables[name] = sn.make_performance_function(
+                sn.make_deferrable(record['busbw']), record['bw_unit']
+            )
 
     @run_after('performance')
     def higher_the_better(self):
@@ -50,7 +162,7 @@ class deepspeed_comm(rfm.RunOnlyRegressionTest):
 class torch_comm_coll_test(deepspeed_comm):
     container_platform = 'Singularity'
     
-    coll_type  = parameter(['all_reduce', 'all_gather'])
+    coll_type  = parameter(['all_reduce', 'all_gather', 'reduce_scatter'])
     run_mode   = parameter(['native', 'torchrun'])
     cont_image = parameter([
         'rocm-6.2.4-python-3.12-pytorch-v2.6.0-dockerhash-ef203c810cc9', #'rocm-6.2.4-python-3.12-pytorch-v2.6.0',
@@ -58,13 +170,21 @@ class torch_comm_coll_test(deepspeed_comm):
         'rocm-6.2.4-python-3.12-pytorch-v2.7.1-dockerhash-0d479e852886', #'rocm-6.2.4-python-3.12-pytorch-v2.7.1',
     ])
 
+    # Trials per size adapt to a 0.5 s budget and a 1% confidence interval
+    bench_opts = variable(str, value='--scan --preallocate --time-budget 0.5 --target-ci 0.01 --dist="torch"')
+
     tags = {'python', 'performance'}
 
     allref = {
                 'all_reduce': (840, -0.1, None, 'Gbps'),
-                'all_gather': (775, -0.1, None, 'Gbps') 
+                'all_gather': (775, -0.1, None, 'Gbps'),
+                # No reduce_scatter reference yet: its size is the full input, so at perf_size it moves
+                # 1/world_size of the all_gather traffic and the all_gather value does not carry over
     }
 
+    # Ops that run without a reference, their throughput is only logged
+    log_only_ops = ['reduce_scatter']
+
     @run_before('run')
     def set_cpu_and_task_binding(self):
         if self.run_mode == 'native':
@@ -77,18 +197,21 @@ class torch_comm_coll_test(deepspeed_comm):
             self.num_tasks_per_node = 1
             self.num_gpus_per_node = 8
             self.num_cpus_per_task = 56
-        if self.coll_type == 'all_gather':
+        if self.coll_type in ['all_gather', 'reduce_scatter']:
             self.extra_resources = {
                'memory': {'mem_per_node': '100G'}
            }
 
+    def get_py_script(self):
+        return 'communication/' + self.coll_type + '.py ' + self.bench_opts
+
     @run_before('run')
     def set_container_variables(self):
         self.container_platform.image = os.path.join(
             '/appl/lumi/containers/easybuild-sif-images/',
             f'lumi-pytorch-{self.cont_image}.sif',
         )
-        py_script = 'communication/' + self.coll_type + '.py --scan --dist="torch"'
+        py_script = self.get_py_script() + ' --json-output ' + self.results_file
         if self.run_mode == 'native':
             self.container_platform.command = 'bash python-distributed.sh -u ' + py_script
         if self.run_mode == 'torchrun':
@@ -105,6 +228,10 @@ class torch_comm_coll_test(deepspeed_comm):
 
     @run_before('run')
     def setup_run(self):
+        if self.coll_type in self.log_only_ops:
+            self.reference = {}
+            return
+
         try:
             found = self.allref[self.coll_type]
         except KeyError:
@@ -115,3 +242,669 @@ class torch_comm_coll_test(deepspeed_comm):
                 'throughput': self.allref[self.coll_type]
             }
         }
+
+
+@rfm.simple_test
+class torch_comm_coll_topology_test(torch_comm_coll_test):
+    # Same collectives on node-local (xGMI) and inter-node (Slingshot) groups
+    bench_opts = '--scan --preallocate --dist="torch" --group-topology'
+    group_classes = {'intra': 'intra-node', 'inter': 'inter-node'}
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of', self.stdout),
+            self.assert_scan_fits(),
+            sn.assert_eq(count_comm_results(self.results_path()), 23*len(self.group_classes)),
+        ])
+
+    @run_before('performance')
+    def set_group_perf_variables(self):
+        # The world-group throughput, latencies and model do not apply, report them per group class
+        for name in ['throughput', 'latency_p50', 'latency_p99', 'latency_rel_ci', 'model_alpha', 'model_busbw',
+                     'model_n_half']:
+            self.perf_variables.pop(name, None)
+        for name, group_class in self.group_classes.items():
+            self.perf_variables[f'throughput_{name}'] = sn.make_performance_function(
+                extract_comm_result(self.results_path(), self.perf_size, 'algbw', group_class=group_class), 'Gbps'
+            )
+            self.perf_variables[f'model_alpha_{name}'] = sn.make_performance_function(
+                extract_model_fit(self.model_path(), 'alpha_us', group_class=group_class), 'us'
+            )
+            self.perf_variables[f'model_busbw_{name}'] = sn.make_performance_function(
+                extract_model_fit(self.model_path(), 'busbw', group_class=group_class), 'Gbps'
+            )
+            self.perf_variables[f'model_n_half_{name}'] = sn.make_performance_function(
+                extract_model_fit(self.model_path(), 'n_half', group_class=group_class), 'B'
+            )
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the per-group throughputs are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_multi_stream_test(torch_comm_coll_test):
+    # coll_type runs on num_streams process groups and streams at the same time
+    num_streams = parameter([2, 4])
+    run_mode = parameter(['native'])
+    bench_opts = '--scan --dist="torch"'
+
+    def get_py_script(self):
+        return (f'communication/multi_stream.py --stream-op {self.coll_type} '
+                f'--streams {self.num_streams} {self.bench_opts}')
+
+    @run_before('performance')
+    def set_stream_perf_variables(self):
+        # throughput is the aggregate over all streams; no per-trial latencies in this mode
+        for name in ['latency_p50', 'latency_p99', 'latency_rel_ci']:
+            self.perf_variables.pop(name, None)
+        stream_busbw = extract_comm_result(self.results_path(), self.perf_size, 'stream_busbw')
+        for s in range(self.num_streams):
+            self.perf_variables[f'busbw_stream{s}'] = sn.make_performance_function(
+                sn.getitem(stream_busbw, s), 'Gbps'
+            )
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the aggregate and per-stream bandwidths are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_overlap_test(torch_comm_coll_test):
+    # coll_type on one stream next to a GEMM on another, as DDP and ZeRO do
+    coll_type = parameter(['all_reduce', 'reduce_scatter'])
+    run_mode = parameter(['native'])
+    gemm_size = variable(int, value=8192)
+    bench_opts = '--scan --dist="torch"'
+
+    def get_py_script(self):
+        return (f'communication/overlap.py --overlap-op {self.coll_type} '
+                f'--gemm-size {self.gemm_size} {self.bench_opts}')
+
+    @run_before('performance')
+    def set_overlap_perf_variables(self):
+        # throughput stays the collective alone; no per-trial latencies in this mode
+        for name in ['latency_p50', 'latency_p99', 'latency_rel_ci']:
+            self.perf_variables.pop(name, None)
+        self.perf_variables['gemm_time'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'gemm_us'), 'us'
+        )
+        self.perf_variables['overlap_time'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'overlap_us'), 'us'
+        )
+        self.perf_variables['overlap_efficiency'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'overlap_efficiency'), ''
+        )
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the overlap metrics are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_coll_campaign_test(torch_comm_coll_test):
+    # All campaign_ops through run_all.py in one allocation, container start and RCCL bootstrap
+    coll_type = parameter(['campaign'])
+    campaign_ops = variable(list, value=['all_reduce', 'all_gather', 'reduce_scatter'])
+
+    def get_py_script(self):
+        op_flags = ' '.join('--' + op.replace('_', '-') for op in self.campaign_ops)
+        return f'communication/run_all.py {op_flags} {self.bench_opts}'
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of', self.stdout),
+            self.assert_scan_fits(),
+            sn.assert_eq(count_comm_results(self.results_path()), 23*len(self.campaign_ops)),
+        ])
+
+    @run_before('run')
+    def set_campaign_memory(self):
+        self.extra_resources = {
+            'memory': {'mem_per_node': '100G'}
+        }
+
+    @run_before('performance')
+    def set_op_perf_variables(self):
+        # The results file holds every op, split the per-op variables back out of it
+        for name in ['throughput', 'latency_p50', 'latency_p99', 'latency_rel_ci', 'model_alpha', 'model_busbw',
+                     'model_n_half']:
+            self.perf_variables.pop(name, None)
+        for op in self.campaign_ops:
+            self.perf_variables[f'throughput_{op}'] = sn.make_performance_function(
+                extract_comm_result(self.results_path(), self.perf_size, 'algbw', op=op), 'Gbps'
+            )
+            self.perf_variables[f'latency_p50_{op}'] = sn.make_performance_function(
+                extract_comm_result(self.results_path(), self.perf_size, 'p50_us', op=op), 'us'
+            )
+            self.perf_variables[f'latency_p99_{op}'] = sn.make_performance_function(
+                extract_comm_result(self.results_path(), self.perf_size, 'p99_us', op=op), 'us'
+            )
+            self.perf_variables[f'model_alpha_{op}'] = sn.make_performance_function(
+                extract_model_fit(self.model_path(), 'alpha_us', op=op), 'us'
+            )
+            self.perf_variables[f'model_busbw_{op}'] = sn.make_performance_function(
+                extract_model_fit(self.model_path(), 'busbw', op=op), 'Gbps'
+            )
+
+    @run_before('run')
+    def setup_run(self):
+        self.reference = {
+            '*': {f'throughput_{op}': self.allref[op] for op in self.campaign_ops if op in self.allref}
+        }
+
+    @run_after('performance')
+    def higher_the_better(self):
+        # perf_relative of the first op, the others are in the perflog against their references
+        perf_var = f'throughput_{self.campaign_ops[0]}'
+        key_str = self.current_partition.fullname+':'+perf_var
+        try:
+            found = self.perfvalues[key_str]
+        except KeyError:
+            return None
+
+        if self.perfvalues[key_str][1] != 0:
+            self.perf_relative = ((self.perfvalues[key_str][0]-self.perfvalues[key_str][1])/self.perfvalues[key_str][1])
+
+
+@rfm.simple_test
+class torch_comm_coll_window_test(torch_comm_coll_test):
+    # window async ops in flight per trial, for pipelined bandwidth and message rate
+    window = parameter([16])
+    run_mode = parameter(['native'])
+    bench_opts = '--scan --preallocate --trial-stats --dist="torch"'
+
+    def get_py_script(self):
+        return super().get_py_script() + f' --window {self.window}'
+
+    @performance_function('1/s')
+    def message_rate(self):
+        # Peak over the scan, reached at the smallest sizes
+        return summarise_comm_results(self.results_path(), 'msg_rate', max)
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the windowed bandwidths and message rates are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_pt2pt_matrix_test(torch_comm_coll_test):
+    # pt2pt between all pairs of ranks, to find a degraded GCD, xGMI link or NIC
+    coll_type = parameter(['pt2pt_matrix'])
+    run_mode = parameter(['native'])
+    matrix_bw_size = variable(int, value=67108864)
+    matrix_latency_size = variable(int, value=8)
+    bench_opts = '--dist="torch" --matrix-budget 600'
+
+    def get_py_script(self):
+        return (f'communication/pt2pt_matrix.py --matrix-bw-size {self.matrix_bw_size} '
+                f'--matrix-latency-size {self.matrix_latency_size} {self.bench_opts}')
+
+    @run_before('run')
+    def fit_model(self):
+        # Two sizes per pair, nothing to fit
+        self.postrun_cmds = []
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of pt2pt matrix', self.stdout),
+            sn.assert_found(r'Flagged pairs', self.stdout),
+        ])
+
+    @run_before('performance')
+    def set_matrix_perf_variables(self):
+        # Replaces all per-size variables, the records are per pair here
+        self.perf_variables = {
+            'flagged_pairs': sn.make_performance_function(
+                summarise_comm_results(self.results_path(), 'flagged', sum, size=self.matrix_bw_size), ''
+            ),
+        }
+        for name, pair_class in {'intra': 'intra-node', 'inter': 'inter-node'}.items():
+            self.perf_variables[f'min_busbw_{name}'] = sn.make_performance_function(
+                summarise_comm_results(self.results_path(), 'busbw', min, size=self.matrix_bw_size,
+                                       pair_class=pair_class), 'Gbps'
+            )
+            self.perf_variables[f'max_latency_{name}'] = sn.make_performance_function(
+                summarise_comm_results(self.results_path(), 'duration_us', max, size=self.matrix_latency_size,
+                                       pair_class=pair_class), 'us'
+            )
+
+    @run_before('run')
+    def setup_run(self):
+        # Healthy nodes have no flagged pairs
+        self.reference = {
+            '*': {
+                'flagged_pairs': (0, None, 0, '')
+            }
+        }
+
+
+@rfm.simple_test
+class torch_comm_init_test(torch_comm_coll_test):
+    # Startup cost of the process group on num_nodes nodes
+    coll_type = parameter(['init'])
+    run_mode = parameter(['native'])
+    num_nodes = parameter([1, 2, 4, 8])
+    init_phases = ['env', 'rendezvous', 'process_group', 'first_collective', 'second_collective']
+    bench_opts = '--dist="torch"'
+
+    def get_py_script(self):
+        return 'communication/init_timing.py ' + self.bench_opts
+
+    @run_before('run')
+    def set_cpu_and_task_binding(self):
+        super().set_cpu_and_task_binding()
+        self.num_tasks = 8 * self.num_nodes
+
+    @run_before('run')
+    def set_init_variables(self):
+        # Leave MASTER_ADDR to the benchmark, which derives it from the Slurm node list
+        self.env_vars.pop('MASTER_ADDR', None)
+        self.env_vars['WORLD_SIZE'] = self.num_tasks
+
+    @run_before('run')
+    def fit_model(self):
+        # A single record, nothing to fit
+        self.postrun_cmds = []
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of init', self.stdout),
+            sn.assert_eq(count_comm_results(self.results_path()), 1),
+        ])
+
+    @run_before('performance')
+    def set_init_perf_variables(self):
+        self.perf_variables = {
+            f'init_{phase}': sn.make_performance_function(
+                summarise_comm_results(self.results_path(), f'{phase}_s', max), 's'
+            )
+            for phase in self.init_phases
+        }
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the startup times are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_pipeline_test(torch_comm_coll_test):
+    # 1F1B p2p traffic of pipeline parallelism, with stages within or across nodes
+    coll_type = parameter(['pipeline'])
+    run_mode = parameter(['native'])
+    # (stages, placement); 16 stages on the 16 ranks form a single pipeline, where spread is the same as packed
+    pipeline_layout = parameter([(4, 'packed'), (4, 'spread'), (16, 'packed')],
+                                fmt=lambda x: f'{x[0]}_{x[1]}', loggable=True)
+    micro_batches = variable(int, value=8)
+    # 32 MB activations, e.g. 2048 tokens of hidden size 8192 in bfloat16
+    perf_size = 33554432
+    bench_opts = '--scan --trial-stats --dist="torch"'
+
+    def get_py_script(self):
+        num_stages, placement = self.pipeline_layout
+        return (f'communication/pipeline.py --stages {num_stages} --placement {placement} '
+                f'--micro-batches {self.micro_batches} {self.bench_opts}')
+
+    @run_before('performance')
+    def set_pipeline_perf_variables(self):
+        results = self.results_path()
+        self.perf_variables['microbatch_rate'] = sn.make_performance_function(
+            extract_comm_result(results, self.perf_size, 'microbatch_rate'), '1/s'
+        )
+        for name, size in {'small': 8, 'large': self.perf_size}.items():
+            self.perf_variables[f'hop_max_{name}'] = sn.make_performance_function(
+                sn.max(extract_comm_result(results, size, 'hop_us')), 'us'
+            )
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the pipeline throughputs and hop latencies are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_ddp_buckets_test(torch_comm_coll_test):
+    # One DDP step of gradient all_reduces, bucketed like the ViT-B/16 training check
+    coll_type = parameter(['ddp_buckets'])
+    run_mode = parameter(['native'])
+    bucket_model = parameter(['vit_b_16'])
+    bench_opts = '--trial-stats --dist="torch"'
+
+    def get_py_script(self):
+        return f'communication/ddp_buckets.py --bucket-model {self.bucket_model} {self.bench_opts}'
+
+    @run_before('run')
+    def fit_model(self):
+        # A single step size, nothing to fit
+        self.postrun_cmds = []
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of ddp_buckets', self.stdout),
+            sn.assert_eq(count_comm_results(self.results_path()), 1),
+        ])
+
+    @run_before('performance')
+    def set_step_perf_variables(self):
+        results = self.results_path()
+        self.perf_variables = {
+            'step_comm_time': sn.make_performance_function(
+                summarise_comm_results(results, 'duration_us', max), 'us'
+            ),
+            'step_comm_p99': sn.make_performance_function(
+                summarise_comm_results(results, 'p99_us', max), 'us'
+            ),
+            'serial_comm_time': sn.make_performance_function(
+                summarise_comm_results(results, 'serial_us', max), 'us'
+            ),
+            'step_busbw': sn.make_performance_function(
+                summarise_comm_results(results, 'busbw', max), 'Gbps'
+            ),
+        }
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the step communication times are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_all_to_all_uneven_test(torch_comm_coll_test):
+    # all_to_all with MoE-like skewed splits
+    coll_type = parameter(['all_to_all_uneven'])
+    run_mode = parameter(['native'])
+    skew = parameter(['uniform', 'zipf', 'hot'])
+    bench_opts = '--scan --trial-stats --dist="torch" --seed 1234'
+
+    def get_py_script(self):
+        return f'communication/all_to_all_uneven.py --skew {self.skew} {self.bench_opts}'
+
+    @run_before('performance')
+    def set_imbalance_perf_variables(self):
+        self.perf_variables['busbw'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'busbw'), 'Gbps'
+        )
+        self.perf_variables['imbalance'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'imbalance'), ''
+        )
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the skewed bandwidths are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_graph_latency_test(torch_comm_coll_test):
+    # Small collectives eager and replayed from a HIP graph, the gap is host overhead
+    coll_type = parameter(['all_reduce', 'all_gather'])
+    run_mode = parameter(['native'])
+    # 8 KB, a tensor-parallel all_reduce in inference
+    perf_size = 8192
+    bench_opts = '--scan --maxsize 16 --dist="torch"'
+
+    def get_py_script(self):
+        return f'communication/graph_latency.py --graph-op {self.coll_type} {self.bench_opts}'
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of', self.stdout),
+            sn.assert_eq(count_comm_results(self.results_path()), 15),
+        ])
+
+    @run_before('performance')
+    def set_graph_perf_variables(self):
+        # Latency matters here, not throughput, and there are no per-trial statistics
+        for name in ['throughput', 'latency_p50', 'latency_p99', 'latency_rel_ci']:
+            self.perf_variables.pop(name, None)
+        self.perf_variables['eager_latency'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'duration_us'), 'us'
+        )
+        self.perf_variables['graph_latency'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'graph_us'), 'us'
+        )
+        self.perf_variables['host_overhead'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'overhead_us'), 'us'
+        )
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the eager and graph latencies are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_rotating_root_test(torch_comm_coll_test):
+    # Rooted collectives from every rank in turn, the root placement matters for trees
+    coll_type = parameter(['broadcast', 'reduce'])
+    run_mode = parameter(['native'])
+    bench_opts = '--scan --rotate-root all --time-budget 0.5 --target-ci 0.01 --dist="torch"'
+
+    @run_before('run')
+    def fit_model(self):
+        # Every root has its own curve, which model_fit.py would mix
+        self.postrun_cmds = []
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of', self.stdout),
+            self.assert_scan_fits(),
+            sn.assert_eq(count_comm_results(self.results_path()), 23*self.num_tasks),
+        ])
+
+    @run_before('performance')
+    def set_root_perf_variables(self):
+        # Slowest and fastest root at perf_size instead of the first root only
+        for name in ['throughput', 'latency_p50', 'latency_p99', 'latency_rel_ci', 'model_alpha', 'model_busbw',
+                     'model_n_half']:
+            self.perf_variables.pop(name, None)
+        results = self.results_path()
+        min_busbw = summarise_comm_results(results, 'busbw', min, size=self.perf_size)
+        max_busbw = summarise_comm_results(results, 'busbw', max, size=self.perf_size)
+        self.perf_variables['min_root_busbw'] = sn.make_performance_function(min_busbw, 'Gbps')
+        self.perf_variables['max_root_busbw'] = sn.make_performance_function(max_busbw, 'Gbps')
+        self.perf_variables['root_spread'] = sn.make_performance_function(max_busbw / min_busbw, '')
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the per-root bandwidths are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_coalesced_test(torch_comm_coll_test):
+    # Many small all_reduces as separate ops, coalesced and flattened, for the per-op overhead
+    coll_type = parameter(['coalesced'])
+    run_mode = parameter(['native'])
+    num_tensors = parameter([16, 128])
+    # 4 KB per tensor, e.g. a layer norm weight
+    perf_tensor_size = variable(int, value=4096)
+    bench_opts = '--scan --maxsize 16 --trial-stats --dist="torch"'
+
+    def get_py_script(self):
+        return f'communication/coalesced.py --num-tensors {self.num_tensors} {self.bench_opts}'
+
+    @run_before('run')
+    def fit_model(self):
+        # Dominated by per-op overhead, not by bandwidth
+        self.postrun_cmds = []
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Performance of', self.stdout),
+            sn.assert_eq(count_comm_results(self.results_path()), 15),
+        ])
+
+    @run_before('performance')
+    def set_coalesced_perf_variables(self):
+        self.perf_variables = {
+            f'{way}_time_per_byte': sn.make_performance_function(
+                summarise_comm_results(self.results_path(), f'{way}_ns_per_byte', max,
+                                       tensor_size=self.perf_tensor_size), 'ns/B'
+            )
+            for way in ['separate', 'coalesced', 'flat']
+        }
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the times per byte are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_hier_all_reduce_test(torch_comm_coll_test):
+    # Two-level all_reduce (xGMI, then Slingshot, then xGMI) against the flat one on num_nodes nodes
+    coll_type = parameter(['hier_all_reduce'])
+    run_mode = parameter(['native'])
+    num_nodes = parameter([2, 4, 8])
+    bench_opts = '--scan --dist="torch"'
+
+    def get_py_script(self):
+        return 'communication/hier_all_reduce.py ' + self.bench_opts
+
+    @run_before('run')
+    def set_cpu_and_task_binding(self):
+        super().set_cpu_and_task_binding()
+        self.num_tasks = 8 * self.num_nodes
+
+    @run_before('run')
+    def set_world_size(self):
+        self.env_vars['WORLD_SIZE'] = self.num_tasks
+
+    @run_before('performance')
+    def set_speedup_perf_variables(self):
+        # Flat over hierarchical time per message size, above 1 where the hierarchy wins
+        for name in ['latency_p50', 'latency_p99', 'latency_rel_ci']:
+            self.perf_variables.pop(name, None)
+        self.perf_variables['flat_busbw'] = sn.make_performance_function(
+            extract_comm_result(self.results_path(), self.perf_size, 'flat_busbw'), 'Gbps'
+        )
+        for record in read_comm_results(self.results_path()):
+            self.perf_variables[f"speedup_{record['size']}"] = sn.make_performance_function(
+                sn.make_deferrable(record['speedup']), ''
+            )
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the speedups are only logged
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_coll_cpu_test(torch_comm_coll_test):
+    # Same collectives on host tensors over gloo, on the LUMI-C nodes
+    valid_systems = ['lumi:cpu']
+    run_mode = parameter(['native'])
+    bench_opts = '--scan --preallocate --trial-stats --dist="torch" --device cpu --backend gloo'
+    num_tasks = 16
+    num_tasks_per_node = 8
+    num_cpus_per_task = 16
+
+    @run_before('run')
+    def set_cpu_and_task_binding(self):
+        # One rank per 16 cores, no GPUs to bind to
+        self.job.launcher.options = ['--cpu-bind=cores']
+
+    @run_before('run')
+    def set_gloo_variables(self):
+        self.env_vars['GLOO_SOCKET_IFNAME'] = 'hsn0'
+        self.env_vars['SINGULARITYENV_OMP_NUM_THREADS'] = str(self.num_cpus_per_task)
+
+    @run_before('run')
+    def setup_run(self):
+        # No references yet, the CPU bandwidths are only logged
+        self.reference = {}
+
+
+class rccl_tuning_run(torch_comm_coll_campaign_test):
+    # One RCCL configuration of the tuning sweep, RCCL reads NCCL_* once per process
+    cont_image = parameter(['rocm-6.2.4-python-3.12-pytorch-v2.7.1-dockerhash-0d479e852886'])
+    run_mode = parameter(['native'])
+    num_nodes = parameter([1, 2])
+    nccl_algo = parameter(['Ring', 'Tree'])
+    # No LL128, RCCL only enables it by default on MI300 (gfx942) and forcing it on MI250X is unsafe
+    nccl_proto = parameter(['Simple', 'LL'])
+    # 0 leaves the channel count to RCCL
+    min_channels = parameter([0, 32])
+    gdr_level = parameter(['PHB', 'LOC'])
+
+    @run_after('init')
+    def set_tuning_ops(self):
+        # RCCL has Tree only for all_reduce, the other ops would abort with no algorithm available
+        if self.nccl_algo == 'Tree':
+            self.campaign_ops = ['all_reduce']
+
+    @run_before('run')
+    def set_cpu_and_task_binding(self):
+        super().set_cpu_and_task_binding()
+        self.num_tasks = 8 * self.num_nodes
+
+    @run_before('run')
+    def set_tuning_variables(self):
+        self.env_vars['WORLD_SIZE'] = self.num_tasks
+        self.env_vars['NCCL_ALGO'] = self.nccl_algo
+        self.env_vars['NCCL_PROTO'] = self.nccl_proto
+        self.env_vars['NCCL_NET_GDR_LEVEL'] = self.gdr_level
+        if self.min_channels:
+            self.env_vars['NCCL_MIN_NCHANNELS'] = self.min_channels
+
+    @run_before('run')
+    def setup_run(self):
+        # Configurations are compared with each other in torch_comm_rccl_tuning_test
+        self.reference = {}
+
+
+@rfm.simple_test
+class torch_comm_rccl_tuning_test(rfm.RunOnlyRegressionTest):
+    # Fastest RCCL configuration of the sweep per op, node count and size band
+    valid_systems = ['lumi:gpu']
+    valid_prog_environs = ['builtin']
+    sourcesdir = 'src'
+    local = True
+    executable = 'python3'
+    sweep = fixture(rccl_tuning_run, scope='environment', action='join')
+    # Kept in the output directory, to derive defaults for the other checks from
+    tuning_file = variable(str, value='rccl_tuning.jsonl')
+    tags = {'python', 'performance'}
+
+    def tuning_path(self):
+        return os.path.join(self.stagedir, self.tuning_file)
+
+    @run_before('run')
+    def set_sweep_results(self):
+        self.executable_opts = ['communication/rccl_tuning.py', '--output', self.tuning_file]
+        self.executable_opts += [run.results_path() for run in self.sweep]
+        self.keep_files = [self.tuning_file]
+
+    @sanity_function
+    def assert_job_is_complete(self):
+        return sn.all([
+            sn.assert_found(r'Fastest RCCL configuration', self.stdout),
+            sn.assert_gt(count_comm_results(self.tuning_path()), 0),
+        ])
+
+    @run_before('performance')
+    def set_band_perf_variables(self):
+        # Bus bandwidth of the fastest configuration and its gain over the slowest, per band
+        self.perf_variables = {}
+        for band in read_comm_results(self.tuning_path()):
+            name = f"{band['op']}_{band['nodes']}n_{band['size_min']}"
+            self.perf_variables[f'busbw_{name}'] = sn.make_performance_function(
+                sn.make_deferrable(band['busbw']), 'Gbps'
+            )
+            self.perf_variables[f'gain_{name}'] = sn.make_performance_function(
+                sn.make_deferrable(band['gain']), ''
+            )